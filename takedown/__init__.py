@@ -22,25 +22,91 @@ find        search repositories
     with following args:
         [search_query]: required. The text used to search.
         [Github_token]: required. The Github token used to raise the rate limit and enable broader search.
+                        Concatenate several tokens by “+” to pool their rate limits, eg. “token1+token2”.
         [-t target]: optional. The target of the search query. It could be “repo”, “code”. It is “code” by default. 
                     Concatenate them by “+”, eg. “-t code+repo”.
+        [-q query file]: optional. The file path of more search queries, one per line. All queries are searched in
+                    one run and merged into one output, each repo is tagged with the queries that found it.
         [-i input]: optional. The file path of previous output of takedown find. By providing this path, the output 
                     this time will be compared against the previous one.
+                    A path ending with “.db” is a record store, created if missing. Other inputs are imported into
+                    it, only the owners found are read from it, and they are written back after the search.
         [-o output]: optional. The output file path. The result will be printed to the console by default.
         [-f format]: optional. The output format. It could be “yaml” or “json”. It is “yaml” by default
+        [-inc watermark file]: optional. Search incrementally, newest results first. Paging stops at the first page
+                    whose repos are all in the input records or not updated since the last run, which is recorded in
+                    the watermark file.
+        [-cp checkpoint]: optional. The file path where the progress of the run is saved after every page. It is
+                    removed once the run finished.
+        [--resume]: optional. Continue the run saved in the checkpoint given by “-cp” instead of starting over.
+        [-si seen index]: optional. The file path of the index of repo ids found by previous runs, created if
+                    missing. Repos in it are redetected even if renamed or moved to another owner.
+        [-ps pool size]: optional. The number of pooled connections kept open to GitHub. It is 10 by default
+        [-n threads]: optional. The number of search result pages fetched concurrently. It is 4 by default
+        [-ca cache path]: optional. The directory of the response cache. Unchanged search pages and user profiles
+                        are then revalidated with GitHub instead of re-downloaded, which saves rate limit.
+        [-oc owner cache]: optional. The file path of the owner profile cache shared by runs. Cached owners are not
+                        requested from GitHub again until they expire.
     or using a configuration file:
     python takedown.py find -c <path_to_config_file>
     config file args:
         required args:
             [search_query]: required. The text used to search.
             [Github_token]: required. The Github token used to raise the rate limit and enable broader search.
+                            Concatenate several tokens by “+” to pool their rate limits, eg. “token1+token2”.
         optional args:
             [target]: optional. The target of the search query. It could be “repo”, “code”. It is “code” by default. 
                     Concatenate them by “+”, eg. “-t code+repo”.
+            [query_file]: optional. The file path of more search queries, one per line. All queries are searched in
+                    one run and merged into one output, each repo is tagged with the queries that found it.
             [input]: optional. The file path of previous output of takedown find. By providing this path, 
                     the output this time will be compared against the previous one.
+                    A path ending with “.db” is a record store, created if missing. Other inputs are imported into
+                    it, only the owners found are read from it, and they are written back after the search.
             [output]: optional. The output file path. The result will be printed to the console by default.
             [format]: optional. The output format. It could be “yaml” or “json”. It is “yaml” by default
+            [incremental]: optional. The watermark file of incremental searches. Results are searched newest first
+                    and paging stops at the first page whose repos are all in the input records or not updated since
+                    the last run.
+            [checkpoint]: optional. The file path where the progress of the run is saved after every page. It is
+                    removed once the run finished.
+            [resume]: optional. “yes” to continue the run saved in the checkpoint instead of starting over.
+            [seen_index]: optional. The file path of the index of repo ids found by previous runs, created if
+                    missing. Repos in it are redetected even if renamed or moved to another owner.
+            [pool_size]: optional. The number of pooled connections kept open to GitHub. It is 10 by default
+            [n_threads]: optional. The number of search result pages fetched concurrently. It is 4 by default
+            [cache_path]: optional. The directory of the response cache. Unchanged search pages and user profiles
+                        are then revalidated with GitHub instead of re-downloaded, which saves rate limit.
+            [cache_size]: optional. The max size of the response cache in MB. It is 64 by default
+            [max_attempts]: optional. The max number of times a request is sent when GitHub fails transiently.
+                        It is 5 by default
+            [retry_deadline]: optional. The max seconds spent retrying one request. It is 300 by default
+            [enrich_threads]: optional. The number of owner profile requests sent concurrently. It is 8 by default
+            [owner_cache]: optional. The file path of the owner profile cache shared by runs. Cached owners are not
+                        requested from GitHub again until they expire.
+            [owner_cache_ttl]: optional. The days an owner profile stays cached. It is 7 by default. Profiles
+                        without public email expire after one day.
+            [record_ttl]: optional. The days the owner profiles of input records stay valid. Owners last detected
+                        earlier are requested from GitHub again. By default profiles of input records are always reused.
+            [history_retention]: optional. The days of status history kept in the records of the repos found.
+                        Older entries are moved to the history archive. All history is kept by default. Repeated
+                        redetections are always merged into one entry with the last date and their count.
+            [history_archive]: optional. The file path where history out of the retention window is appended, one
+                        JSON line per repo. Without it, such history is dropped. Archived history is read on demand
+                        with takedown.storage.HistoryArchive.HistoryArchive(path).load(username, repo_name).
+
+monitor     search repositories on a schedule in one long running process
+    python takedown.py monitor [search_query] [GitHub_token] [-options]
+    with the args of find, and:
+        [-iv interval]: optional. The minutes between the starts of two sweeps. It is 60 by default
+        [-sw sweeps]: optional. The number of sweeps to run. The monitor runs until Ctrl-C by default
+    Connections, rate limits and owner profiles are kept between sweeps. After each sweep, only the repos that are new
+    or changed status are output, to a new file named after the output path and stamped with the sweep time.
+    or using a configuration file:
+    python takedown.py monitor -c <path_to_config_file>
+    config file args are the ones of find, and:
+            [interval]: optional. The minutes between the starts of two sweeps. It is 60 by default
+            [sweeps]: optional. The number of sweeps to run. The monitor runs until Ctrl-C by default
 
 send        send emails based on records
     python takedown send [domain] [port] [inputs] [-options]
@@ -48,6 +114,8 @@ send        send emails based on records
         [domain]: required. The domain address to connect
         [port]: required. port of domain to connect
         [inputs]: required. Input files to send email
+                  A path ending with “.db” is a record store, only the owners with repos matching the tags are
+                  read from it and written back.
         [-u username]: optional. username of the account. or ask
         [-p password]: optional. password of the account. or ask
         [-s secure method]: optional. It could be “TLS” or “SSL”, depending on the domain and port connected. 
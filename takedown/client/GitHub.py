@@ -4,10 +4,29 @@ GitHub implement of BaseSite
 GitHub search restful API docs: https://docs.github.com/en/free-pro-team@latest/rest/reference/search
 """
 from .BaseSite import BaseSite, SiteResult
-from requests import Session, Request
+from .TokenPool import TokenPool
+from .ResponseCache import ResponseCache, DEFAULT_CACHE_SIZE
+from .RetryPolicy import RetryPolicy, DEFAULT_MAX_ATTEMPTS, DEFAULT_DEADLINE
+from requests import Session, Request, Response
+from requests.exceptions import RequestException
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 import typing
+import time
 import sys
 
+# number of pooled keep-alive connections kept open to api.github.com
+DEFAULT_POOL_SIZE = 10
+# number of workers fetching search pages concurrently
+DEFAULT_N_THREADS = 4
+# GitHub search returns at most 1000 results, 100 per page
+PER_PAGE = 100
+MAX_PAGES = 10
+# number of times a request is re-sent after being rejected by a rate limit
+MAX_RATE_LIMIT_WAITS = 3
+# owners resolved by one GraphQL query, GitHub allows at most 100 nodes per connection
+GRAPHQL_BATCH_SIZE = 100
+
 
 class GitHubClient(BaseSite):
 
@@ -15,10 +34,28 @@ class GitHubClient(BaseSite):
         """
         init Github search
         :param config: a set of configs user would like to include, will provide more customization
+                       pool_size: max number of keep-alive connections shared by all requests of this client
+                       cache_path: directory of the conditional request cache, no cache by default
+                       cache_size: max bytes of the conditional request cache
+                       max_attempts: max number of times a request is sent on transient failures
+                       retry_deadline: max seconds spent retrying one request
         """
         super().__init__(**config)
         self.__dict__.update(config)
         self.base_url = 'https://api.github.com'
+        self.pool_size = config.get("pool_size", DEFAULT_POOL_SIZE)
+        # one long-lived session so search pages and user lookups reuse warm connections
+        self.session = Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # shared by every thread of this client, paces search and core requests of each token separately
+        self.token_pool = TokenPool()
+        self.cache = None
+        if config.get("cache_path"):
+            self.cache = ResponseCache(config["cache_path"], config.get("cache_size", DEFAULT_CACHE_SIZE))
+        self.retry_policy = RetryPolicy(config.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+                                        config.get("retry_deadline", DEFAULT_DEADLINE))
         self.__search_options = {
             'code': '/search/code',
             'commits': '/search/commits',
@@ -30,19 +67,228 @@ class GitHubClient(BaseSite):
             'org': 'org:'
         }
         self.__is_authenticated = False
-        self.__OAuth_token = None
 
-    def authenticate(self, token):
+    def authenticate(self, token: typing.Union[str, typing.Iterable]):
         """
         OAuth will enable massive search and search code without certain limits
+        :param token: one token, or several tokens whose budgets are pooled
         :return:
         """
         if self.__is_authenticated:
             print("Re-entered token")
         self.__is_authenticated = True
-        self.__OAuth_token = token
+        self.token_pool = TokenPool([token] if isinstance(token, str) else list(token))
+        return self
+
+    def close(self):
+        """
+        release pooled connections held by the client
+        :return:
+        """
+        self.session.close()
+
+    def rate_limit(self, resource: str = 'core') -> dict:
+        """
+        remaining budget of the client
+        :param resource: 'search' | 'core'
+        :return: { "limit", "remaining", "reset" }, combined over all tokens, reset is the earliest epoch timestamp
+        """
+        return self.token_pool.remaining(resource)
+
+    def refresh_rate_limit(self):
+        """
+        sync the rate limiter with GitHub, requests to /rate_limit are not counted against any budget
+        :return: self instance
+        """
+        for token in self.token_pool.tokens():
+            headers = {
+                'accept': 'application/vnd.github.v3+json',
+                'user-agent': 'python'
+            }
+            if token:
+                headers['Authorization'] = "token {}".format(token)
+            try:
+                res = self.session.get(self.base_url + '/rate_limit', headers=headers)
+            except RequestException as e:
+                print("Rate limit cannot be synced with GitHub: {}".format(e), file=sys.stderr)
+                continue
+            if res.status_code != 200:
+                self.print_error(res)
+                continue
+            for resource, budget in res.json().get("resources", {}).items():
+                self.token_pool.limiter(token).sync(resource, budget["limit"], budget["remaining"], budget["reset"])
         return self
 
+    def __send(self, request, resource: str):
+        """
+        send a prepared request with the token of most remaining budget, waiting out rate limit rejections and
+        retrying transient failures as the retry policy allows
+        :param request: prepared request without Authorization header
+        :param resource: 'search' | 'core', the rate limit the request counts against
+        :return: None if no response was received, otherwise requests.Response
+        """
+        res = None
+        started = time.time()
+        attempt = 0
+        rate_limit_waits = 0
+        while True:
+            token = self.token_pool.acquire(resource)
+            authorized_request = request.copy()
+            if token:
+                authorized_request.headers['Authorization'] = "token {}".format(token)
+            cached = None
+            if self.cache and request.method.upper() == "GET":
+                cached = self.cache.get(request.url, token)
+                if cached and cached["etag"]:
+                    authorized_request.headers['If-None-Match'] = cached["etag"]
+                elif cached and cached["last_modified"]:
+                    authorized_request.headers['If-Modified-Since'] = cached["last_modified"]
+            error = None
+            try:
+                res = self.session.send(authorized_request, timeout=self.retry_policy.timeout)
+            except RequestException as e:
+                res = None
+                error = e
+                # e.g. an invalid url or too many redirects fails the same way every time
+                if not self.retry_policy.is_retryable(error=e):
+                    print("Request to {} failed: {}".format(request.url, str(e)), file=sys.stderr)
+                    return None
+            if error is None:
+                if cached and res.status_code == 304:
+                    # not counted against the rate limit
+                    self.token_pool.limiter(token).release(resource)
+                    self.token_pool.limiter(token).update(resource, res)
+                    self.cache.record(hit=True)
+                    return self.__replay(res, cached)
+                if self.token_pool.limiter(token).update(resource, res):
+                    rate_limit_waits += 1
+                    if rate_limit_waits >= MAX_RATE_LIMIT_WAITS:
+                        return res
+                    print("Rate limit of {} requests reached, waiting for the budget to reset...".format(resource),
+                          file=sys.stderr)
+                    continue
+                if not self.retry_policy.is_retryable(res):
+                    if self.cache and request.method.upper() == "GET":
+                        self.cache.record(hit=False)
+                        if res.status_code == 200:
+                            self.cache.store(request.url, token, res)
+                    return res
+
+            attempt += 1
+            delay = self.retry_policy.backoff(attempt, res)
+            reason = str(error) if error is not None else "status {}".format(res.status_code)
+            if not self.retry_policy.allows(attempt, started, delay):
+                print("Request to {} failed after {} attempts: {}".format(request.url, attempt, reason),
+                      file=sys.stderr)
+                return res
+            print("Request to {} failed: {}. Retrying in {:.1f}s...".format(request.url, reason, delay),
+                  file=sys.stderr)
+            time.sleep(delay)
+
+    @staticmethod
+    def print_error(res):
+        """
+        print the error message of a failed response
+        :param res: None | requests.Response
+        :return:
+        """
+        if res is None:
+            print("No response received from GitHub", file=sys.stderr)
+            return
+        try:
+            print(res.json(), file=sys.stderr)
+        except ValueError:
+            print("{} {}".format(res.status_code, res.text), file=sys.stderr)
+
+    @staticmethod
+    def __replay(not_modified, cached: dict) -> Response:
+        """
+        turn a 304 response into the cached 200 response
+        :param not_modified: the 304 response
+        :param cached: cache entry
+        :return: requests.Response
+        """
+        res = Response()
+        res.status_code = 200
+        res.url = not_modified.url
+        res.headers = not_modified.headers
+        res.encoding = "utf-8"
+        res._content = cached["body"].encode("utf-8")
+        return res
+
+    def cache_stats(self) -> dict:
+        """
+        :return: None if no cache configured, or { "hits", "misses", "size" }
+        """
+        return self.cache.stats() if self.cache else None
+
+    def get_user(self, url: str):
+        """
+        fetch the profile of an owner, e.g. the `owner__url` field of a search result
+        :param url: api url of the user or organization
+        :return: None | dict of user info
+        """
+        headers = {
+            'accept': 'application/vnd.github.v3+json',
+            'user-agent': 'python'
+        }
+        res = self.__send(Request(method="get", url=url, headers=headers).prepare(), 'core')
+        if res is None or res.status_code != 200:
+            self.print_error(res)
+            return None
+        return res.json()
+
+    def get_users(self, owners: typing.Iterable) -> dict:
+        """
+        fetch the profiles of many owners through the GraphQL API, GRAPHQL_BATCH_SIZE owners per request.
+        GraphQL requires a token, no owner is resolved without one.
+        :param owners: iterable of (login, type), type is the `owner__type` of a search result: 'User' | 'Organization'
+        :return: { login: dict of user info shaped as get_user() }, owners that cannot be resolved are omitted
+        """
+        users = {}
+        if not self.__is_authenticated:
+            return users
+        owners = list(owners)
+        headers = {
+            'accept': 'application/json',
+            'user-agent': 'python'
+        }
+        for start in range(0, len(owners), GRAPHQL_BATCH_SIZE):
+            batch = owners[start:start + GRAPHQL_BATCH_SIZE]
+            # logins are passed as variables so they never need escaping
+            query = "query({}) {{ {} }}".format(
+                ", ".join("$l{}: String!".format(index) for index in range(len(batch))),
+                " ".join(
+                    "o{0}: {1}(login: $l{0}) {{ login name email url }}".format(
+                        index, "organization" if owner_type == "Organization" else "user"
+                    )
+                    for index, (_, owner_type) in enumerate(batch)
+                )
+            )
+            variables = {"l{}".format(index): login for index, (login, _) in enumerate(batch)}
+            res = self.__send(Request(
+                method="post",
+                url=self.base_url + '/graphql',
+                json={"query": query, "variables": variables},
+                headers=headers
+            ).prepare(), 'graphql')
+            if res is None or res.status_code != 200:
+                self.print_error(res)
+                continue
+            # owners that cannot be resolved come back as null along with an error entry
+            data = res.json().get("data") or {}
+            for index, (login, _) in enumerate(batch):
+                profile = data.get("o{}".format(index))
+                if profile:
+                    users[login] = {
+                        "login": profile["login"],
+                        "name": profile["name"],
+                        # private emails are empty strings in GraphQL but null in REST
+                        "email": profile["email"] or None,
+                        "html_url": profile["url"]
+                    }
+        return users
+
     def search(self, source: str, search_option: str, target: str = None, target_type: str = None, n_threads: int = None
                , **other_options):
         """
@@ -51,9 +297,65 @@ class GitHubClient(BaseSite):
         :param target: the target of target_type
         :param source: search string
         :param search_option: 'code' | 'commits'
-        :param n_threads: not implemented
+        :param n_threads: if provided, the first page is fetched and then every other available page is fetched
+                          concurrently by n_threads workers and appended in page order
+        :param other_options: page: page to fetch, 1 by default
+                              fields: fields to extract from each item, DEFAULT_FIELDS of the result type by default
+                              sort: 'indexed' for code, 'updated' | 'stars' | ... for repo, newest first. Best match
+                              by default
         :return: None | CodeSearchResult
         """
+        results = self.__search_page(source, search_option, target, target_type, **other_options)
+        if not results or not n_threads:
+            return results
+        pages = range(other_options.get('page', 1) + 1, min(MAX_PAGES, -(-results.total // PER_PAGE)) + 1)
+        for page_result in self.search_pages(source, search_option, pages, n_threads, target, target_type,
+                                             other_options.get('fields')):
+            if not page_result:
+                return None
+            results.extend(page_result)
+        return results
+
+    def search_pages(self, source: str, search_option: str, pages: typing.Iterable, n_threads: int = DEFAULT_N_THREADS,
+                     target: str = None, target_type: str = None, fields: typing.Iterable = None) -> list:
+        """
+        fetch several pages of one search concurrently
+        :param source: search string
+        :param search_option: 'code' | 'commits' | 'repo'
+        :param pages: page numbers to fetch, each is independent of the others
+        :param n_threads: number of workers
+        :param target: the target of target_type
+        :param target_type: 'user' | 'repo' | 'org'
+        :param fields: fields to extract from each item, see search()
+        :return: list of results in the order of pages, failed pages are None
+        """
+        with ThreadPoolExecutor(max_workers=max(1, n_threads)) as executor:
+            return list(executor.map(
+                lambda page: self.__search_page(source, search_option, target, target_type, page=page, fields=fields),
+                pages
+            ))
+
+    def __search_page(self, source: str, search_option: str, target: str = None, target_type: str = None,
+                      **other_options):
+        """
+        fetch one page of search results, see search()
+        """
+        prepared = self.__prepare_search(source, search_option, target, target_type, **other_options)
+        if not prepared:
+            return None
+        req, result_type = prepared
+        res = self.__send(req, 'search')
+        if res is not None and res.status_code == 200:
+            return result_type(res.json(), fields=other_options.get('fields'))
+        self.print_error(res)
+        return None
+
+    def __prepare_search(self, source: str, search_option: str, target: str = None, target_type: str = None,
+                         **other_options):
+        """
+        build the request of one page of search results, see search()
+        :return: None | (prepared request, type of search result)
+        """
         # sanity checks
         if not search_option or search_option not in self.__search_options:
             print("Missing a search_option that falls in the category", file=sys.stderr)
@@ -63,22 +365,22 @@ class GitHubClient(BaseSite):
             print("Missing a valid search controller", file=sys.stderr)
             return None
 
-        session = Session()
         source = source.replace(" ", "+")
-        results = None
+        params = {
+            'page': other_options.get('page', 1),
+            'per_page': PER_PAGE,
+            'q': source
+        }
+        if other_options.get('sort'):
+            params['sort'] = other_options['sort']
+            params['order'] = 'desc'
+        headers = {
+            'accept': 'application/vnd.github.v3+json',
+            'user-agent': 'python'
+        }
         # a very basic implementation of one API file content
-        if search_option == "code":
-            params = {
-                'page': other_options.get('page', 1),
-                'per_page': 100,
-                'q': source
-            }
-            headers = {
-                'accept': 'application/vnd.github.v3+json',
-                'user-agent': 'python'
-            }
+        if search_option == "code" or search_option == "repo":
             if self.__is_authenticated:
-                headers['Authorization'] = "token {}".format(self.__OAuth_token)
                 if target and target_type and target in target_type:
                     params['q'] += '+' + self.__target_type[target_type] + target
             else:
@@ -87,251 +389,157 @@ class GitHubClient(BaseSite):
                 if not target or not target_type or target_type not in self.__target_type:
                     print("Missing a target and a target type for code searching when no token is provided",
                           file=sys.stderr)
-                    session.close()
                     return None
-                params = {
-                    'page': other_options.get('page', 1),
-                    'per_page': 100,
-                    'q': source + '+in:file+' + self.__target_type[target_type] + target
-                }
-            req = Request(
-                method="get",
-                url=self.base_url + self.__search_options[search_option],
-                params="&".join("%s=%s" % (k, v) for k, v in params.items()),
-                headers=headers
-            ) \
-                .prepare()
-            res = session.send(req)
-            if res.status_code == 200:
-                results = CodeSearchResult(res.json())
-            else:
-                print(res.json(), file=sys.stderr)
-        elif search_option == "commits":
-            params = {
-                'page': other_options.get('page', 1),
-                'per_page': 100,
-                'q': source
-            }
-            headers = {
-                'accept': 'application/vnd.github.cloak-preview+json',
-                'user-agent': 'python'
-            }
-            if self.__is_authenticated:
-                headers['Authorization'] = "token {}".format(self.__OAuth_token)
+                params['q'] = source + '+in:file+' + self.__target_type[target_type] + target
+            result_type = CodeSearchResult if search_option == "code" else RepoSearchResult
+        else:
+            headers['accept'] = 'application/vnd.github.cloak-preview+json'
             if target and target_type and target in target_type:
                 params['q'] += '+' + self.__target_type[target_type] + target
-            req = Request(
-                method="get",
-                url=self.base_url + self.__search_options[search_option],
-                params="&".join("%s=%s" % (k, v) for k, v in params.items()),
-                headers=headers
-            ) \
-                .prepare()
-            res = session.send(req)
-            if res.status_code == 200:
-                results = CommitSearchResult(res.json())
-            else:
-                print(res.json(), file=sys.stderr)
-        elif search_option == "repo":
-            params = {
-                'page': other_options.get('page', 1),
-                'per_page': 100,
-                'q': source
-            }
-            headers = {
-                'accept': 'application/vnd.github.v3+json',
-                'user-agent': 'python'
-            }
-            if self.__is_authenticated:
-                headers['Authorization'] = "token {}".format(self.__OAuth_token)
-                if target and target_type and target in target_type:
-                    params['q'] += '+' + self.__target_type[target_type] + target
-            else:
-                print("Note that code search is unable to search the entire GitHub according to the provided "
-                      "APIs unless a token is provided through function authenticate()")
-                if not target or not target_type or target_type not in self.__target_type:
-                    print("Missing a target and a target type for code searching when no token is provided",
-                          file=sys.stderr)
-                    session.close()
-                    return None
-                params = {
-                    'page': other_options.get('page', 1),
-                    'per_page': 100,
-                    'q': source + '+in:file+' + self.__target_type[target_type] + target
-                }
-            req = Request(
-                method="get",
-                url=self.base_url + self.__search_options[search_option],
-                params="&".join("%s=%s" % (k, v) for k, v in params.items()),
-                headers=headers
-            ) \
-                .prepare()
-            res = session.send(req)
-            if res.status_code == 200:
-                results = RepoSearchResult(res.json())
-            else:
-                print(res.json(), file=sys.stderr)
-        else:
-            print("search option error", file=sys.stderr)
-        # clean up
-        session.close()
-        return results
-
-
-class Item:
-    def __init__(self):
-        self.__fields = {}
-
-    def store(self, key, value):
-        self.__fields[key] = value
-
-    def get(self, key):
-        return self.__fields[key]
-
-    def fields(self):
-        return self.__fields.keys()
-
-
-class CodeSearchResult(SiteResult):
-
-    def __init__(self, json, **config):
-        super().__init__(**config)
-        self.__raw_results = json
-        self.__items = self.__process()
-        self.total = json["total_count"]
-        self.completed = json["incomplete_results"]
-
-    def __process(self):
-        items = []
-        raw_items = self.__raw_results["items"]
-        for raw_item in raw_items:
-            item = Item()
-            repo = raw_item.pop("repository")
-            owner = repo.pop("owner")
-            for k, v in raw_item.items():
-                item.store('file__' + k, v)
-            for k, v in repo.items():
-                item.store('repo__' + k, v)
-            for k, v in owner.items():
-                item.store('owner__' + k, v)
-            items.append(item)
-        return items
-
-    def print_list(self, fields: typing.Union[str, typing.Iterable] = "owner__login", **config):
+            result_type = CommitSearchResult
+        req = Request(
+            method="get",
+            url=self.base_url + self.__search_options[search_option],
+            params="&".join("%s=%s" % (k, v) for k, v in params.items()),
+            headers=headers
+        ) \
+            .prepare()
+        return req, result_type
+
+    def iter_search_pages(self, source: str, search_option: str, target: str = None, target_type: str = None,
+                          fields: typing.Iterable = None, page: int = 1, max_items: int = None, prefetch: bool = True,
+                          **other_options):
         """
-        generate the list of output returned by GitHub
-        :param fields: list | string, see get_fields()
-        :param config:
-        :return:
+        iterate search results page by page, following the `next` link GitHub returns with each page
+        :param source: search string
+        :param search_option: 'code' | 'commits' | 'repo'
+        :param target: the target of target_type
+        :param target_type: 'user' | 'repo' | 'org'
+        :param fields: fields to extract from each item, see search()
+        :param page: first page to request
+        :param max_items: no further page is requested once the pages retrieved hold this many items
+        :param prefetch: request the next page while the current one is consumed
+        :param other_options: sort, see search()
+        :return: generator of (page number, search result). Raises RuntimeError if a page cannot be retrieved.
         """
-        if isinstance(fields, str):
-            print("".join(map(lambda i: "{}\n".format(i.get(fields)), self.__items)))
-        else:
-            for item in self.__items:
-                print(" ".join([item.get(field) for field in fields]))
-
-    def generate_list(self, fields: typing.Union[str, typing.Iterable] = "owner__login", **config) -> list:
-        res = []
-        if isinstance(fields, str):
-            res = map(lambda i: i.get(fields), self.__items)
-        else:
-            for item in self.__items:
-                res.append({
-                    field: item.get(field) for field in fields
-                })
-        return res
-
-    def get_fields(self) -> set:
+        prepared = self.__prepare_search(source, search_option, target, target_type, page=page, **other_options)
+        if not prepared:
+            raise RuntimeError("search of page {} cannot be prepared".format(page))
+        req, result_type = prepared
+        count = 0
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = executor.submit(self.__send, req, 'search')
+            while pending is not None:
+                res = pending.result()
+                pending = None
+                if res is None or res.status_code != 200:
+                    self.print_error(res)
+                    raise RuntimeError("search of page {} failed".format(page))
+                page_result = result_type(res.json(), fields=fields)
+                count += len(page_result)
+                next_req = None
+                next_link = res.links.get("next")
+                if next_link and page < MAX_PAGES and (max_items is None or count < max_items):
+                    next_req = Request(method="get", url=next_link["url"], headers=req.headers).prepare()
+                    if prefetch:
+                        pending = executor.submit(self.__send, next_req, 'search')
+                yield page, page_result
+                if next_req is not None and pending is None:
+                    pending = executor.submit(self.__send, next_req, 'search')
+                page += 1
+
+    def iter_search(self, source: str, search_option: str, target: str = None, target_type: str = None,
+                    fields: typing.Iterable = None, max_items: int = None, prefetch: bool = True):
         """
-        get all available fields that can be accessed
-        :return:
+        iterate search items as their pages arrive, see iter_search_pages()
+        :param source: search string
+        :param search_option: 'code' | 'commits' | 'repo'
+        :param target: the target of target_type
+        :param target_type: 'user' | 'repo' | 'org'
+        :param fields: fields to extract from each item, see search()
+        :param max_items: stop after this many items, no further page is requested
+        :param prefetch: request the next page while items of the current one are consumed
+        :return: generator of dict { field: value }
         """
-
-        return set() if len(self.__items) == 0 else self.__items[0].fields()
-
-
-class CommitSearchResult(SiteResult):
-
-    def __init__(self, json, **config):
+        fields = list(fields) if fields else None
+        pages = self.iter_search_pages(source, search_option, target, target_type, fields, max_items=max_items,
+                                       prefetch=prefetch)
+        count = 0
+        try:
+            for _, page_result in pages:
+                for item in page_result.generate_list(fields or page_result.DEFAULT_FIELDS):
+                    if max_items is not None and count >= max_items:
+                        return
+                    yield item
+                    count += 1
+        except RuntimeError as e:
+            print("Error in search: {}".format(e), file=sys.stderr)
+        finally:
+            # a prefetched page is waited for, not left running
+            pages.close()
+
+
+class SearchResult(SiteResult):
+    """
+    one or more pages of search results. Only the fields of the schema are extracted from the raw items, each
+    item is stored as a tuple ordered by the schema and the raw payload is dropped after parsing.
+    """
+
+    # prefix of a field: path to the object holding it in a raw item
+    PREFIXES = {}
+    # fields extracted by default
+    DEFAULT_FIELDS = ()
+
+    def __init__(self, json, fields: typing.Iterable = None, **config):
         super().__init__(**config)
-        self.__raw_results = json
-        self.__items = self.__process()
+        fields = tuple(fields) if fields else self.DEFAULT_FIELDS
+        self.__schema = {field: index for index, field in enumerate(fields)}
+        self.__items = self.__process(json["items"], fields)
         self.total = json["total_count"]
         self.completed = json["incomplete_results"]
 
-    def __process(self):
+    def __process(self, raw_items: list, fields: tuple) -> list:
+        extractors = []
+        for field in fields:
+            prefix, key = field.split("__", 1)
+            extractors.append((self.PREFIXES[prefix], key))
         items = []
-        raw_items = self.__raw_results["items"]
         for raw_item in raw_items:
-            item = Item()
-            author = raw_item.pop("author")
-            committer = raw_item.pop("committer")
-            repo = raw_item.pop("repository")
-            for k, v in raw_item.items():
-                item.store('commit__' + k, v)
-            for k, v in repo.items():
-                item.store('repo__' + k, v)
-            for k, v in author.items():
-                item.store('author__' + k, v)
-            for k, v in committer.items():
-                item.store('committer__' + k, v)
-            items.append(item)
+            values = []
+            for path, key in extractors:
+                source = raw_item
+                for step in path:
+                    source = source.get(step) or {}
+                values.append(source.get(key))
+            items.append(tuple(values))
         return items
 
-    def print_list(self, fields: typing.Union[str, typing.Iterable] = "owner__login", **config) -> None:
+    def extend(self, other):
         """
-        generate the list of output returned by GitHub
-        :param fields: list | string, see get_fields()
-        :param config:
+        append items of another page of the same search
+        :param other: result of the same type and fields
         :return:
         """
-        if isinstance(fields, str):
-            print("".join(map(lambda i: "{}\n".format(i.get(fields)), self.__items)))
-        else:
-            for item in self.__items:
-                print(" ".join([item.get(field) for field in fields]))
-
-    def generate_list(self, fields: typing.Union[str, typing.Iterable] = "owner__login", **config) -> []:
-        res = []
-        if isinstance(fields, str):
-            res = map(lambda i: i.get(fields), self.__items)
-        else:
-            for item in self.__items:
-                res.append({
-                    field: item.get(field) for field in fields
-                })
-        return res
+        self.__items.extend(other.__items)
 
-    def get_fields(self) -> set:
+    def unique(self, field: str, seen: set = None):
         """
-        get all available fields that can be accessed
+        drop items whose value of field has been seen in an earlier item
+        :param field: see get_fields()
+        :param seen: values seen in other results, updated with the values of this one
         :return:
         """
-
-        return set() if len(self.__items) == 0 else self.__items[0].fields()
-
-
-class RepoSearchResult(SiteResult):
-
-    def __init__(self, json, **config):
-        super().__init__(**config)
-        self.__raw_results = json
-        self.__items = self.__process()
-        self.total = json["total_count"]
-        self.completed = json["incomplete_results"]
-
-    def __process(self):
+        index = self.__schema[field]
+        seen = seen if seen is not None else set()
         items = []
-        raw_items = self.__raw_results["items"]
-        for raw_item in raw_items:
-            item = Item()
-            owner = raw_item.pop("owner")
-            for k, v in raw_item.items():
-                item.store('repo__' + k, v)
-            for k, v in owner.items():
-                item.store('owner__' + k, v)
-            items.append(item)
-        return items
+        for item in self.__items:
+            if item[index] not in seen:
+                seen.add(item[index])
+                items.append(item)
+        self.__items = items
+
+    def __len__(self):
+        return len(self.__items)
 
     def print_list(self, fields: typing.Union[str, typing.Iterable] = "owner__login", **config) -> None:
         """
@@ -341,21 +549,20 @@ class RepoSearchResult(SiteResult):
         :return:
         """
         if isinstance(fields, str):
-            print("".join(map(lambda i: "{}\n".format(i.get(fields)), self.__items)))
+            print("".join("{}\n".format(value) for value in self.generate_list(fields)))
         else:
-            for item in self.__items:
-                print(" ".join([item.get(field) for field in fields]))
+            for item in self.generate_list(fields):
+                print(" ".join(str(item[field]) for field in fields))
 
-    def generate_list(self, fields: typing.Union[str, typing.Iterable] = "owner__login", **config) -> []:
-        res = []
+    def generate_list(self, fields: typing.Union[str, typing.Iterable] = "owner__login", **config) -> list:
         if isinstance(fields, str):
-            res = map(lambda i: i.get(fields), self.__items)
-        else:
-            for item in self.__items:
-                res.append({
-                    field: item.get(field) for field in fields
-                })
-        return res
+            index = self.__schema[fields]
+            return [item[index] for item in self.__items]
+        fields = list(fields)
+        indexes = [self.__schema[field] for field in fields]
+        return [
+            dict(zip(fields, [item[index] for index in indexes])) for item in self.__items
+        ]
 
     def get_fields(self) -> set:
         """
@@ -363,4 +570,47 @@ class RepoSearchResult(SiteResult):
         :return:
         """
 
-        return set() if len(self.__items) == 0 else self.__items[0].fields()
+        return set(self.__schema.keys())
+
+
+class CodeSearchResult(SearchResult):
+
+    PREFIXES = {
+        'file': (),
+        'repo': ('repository',),
+        'owner': ('repository', 'owner'),
+    }
+    DEFAULT_FIELDS = (
+        'file__name', 'file__path', 'file__sha', 'file__html_url',
+        'repo__id', 'repo__name', 'repo__full_name', 'repo__html_url', 'repo__private', 'repo__fork',
+        'owner__id', 'owner__login', 'owner__type', 'owner__url', 'owner__html_url',
+    )
+
+
+class CommitSearchResult(SearchResult):
+
+    PREFIXES = {
+        'commit': (),
+        'repo': ('repository',),
+        'author': ('author',),
+        'committer': ('committer',),
+    }
+    DEFAULT_FIELDS = (
+        'commit__sha', 'commit__html_url',
+        'repo__id', 'repo__name', 'repo__full_name', 'repo__html_url',
+        'author__id', 'author__login', 'author__url', 'author__html_url',
+        'committer__id', 'committer__login', 'committer__url', 'committer__html_url',
+    )
+
+
+class RepoSearchResult(SearchResult):
+
+    PREFIXES = {
+        'repo': (),
+        'owner': ('owner',),
+    }
+    DEFAULT_FIELDS = (
+        'repo__id', 'repo__name', 'repo__full_name', 'repo__html_url', 'repo__description', 'repo__private',
+        'repo__fork', 'repo__size', 'repo__language', 'repo__created_at', 'repo__updated_at', 'repo__pushed_at',
+        'owner__id', 'owner__login', 'owner__type', 'owner__url', 'owner__html_url',
+    )
@@ -0,0 +1,151 @@
+"""
+QuerySharder
+---------------------------
+GitHub search returns at most 1000 results of a query. The sharder splits a query with a range qualifier, e.g.
+`size:` for code or `created:` for repositories, until each shard matches at most 1000 results, fetches every shard
+and dedupes the union by repository.
+GitHub search qualifiers docs: https://docs.github.com/en/free-pro-team@latest/github/searching-for-information-on-github
+"""
+
+from .GitHub import PER_PAGE, MAX_PAGES, DEFAULT_N_THREADS
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import datetime
+import sys
+import typing
+
+
+class RangeQualifier:
+    """
+    a numeric range qualifier that can be split in halves
+    """
+
+    def __init__(self, name: str, low: int, high: int):
+        self.name = name
+        self.low = low
+        self.high = high
+
+    def format(self, value: int) -> str:
+        return str(value)
+
+    def qualify(self, source: str, low: int, high: int) -> str:
+        return "{} {}:{}..{}".format(source, self.name, self.format(low), self.format(high))
+
+
+class DateQualifier(RangeQualifier):
+    """
+    a date range qualifier, values are date ordinals
+    """
+
+    def __init__(self, name: str, first_date: datetime.date):
+        super().__init__(name, first_date.toordinal(), datetime.date.today().toordinal())
+
+    def format(self, value: int) -> str:
+        return datetime.date.fromordinal(value).isoformat()
+
+
+# GitHub only indexes files smaller than 384 KB, and was founded in 2008
+SHARD_QUALIFIERS = {
+    'code': lambda: RangeQualifier('size', 0, 384 * 1024),
+    'repo': lambda: DateQualifier('created', datetime.date(2008, 1, 1)),
+    'commits': lambda: DateQualifier('committer-date', datetime.date(2008, 1, 1)),
+}
+# search results reachable by paging through one query
+MAX_RESULTS = PER_PAGE * MAX_PAGES
+
+
+class QuerySharder:
+
+    def __init__(self, client, n_threads: int = DEFAULT_N_THREADS):
+        """
+        init sharder
+        :param client: GitHubClient used to send the searches, its rate limiter paces the shards
+        :param n_threads: number of shard pages searched concurrently
+        """
+        self.client = client
+        self.n_threads = max(1, n_threads)
+
+    def iter_pages(self, source: str, search_option: str, target: str = None, target_type: str = None,
+                   fields: typing.Iterable = None, skip: typing.Collection = (), total: int = None):
+        """
+        generator of the pages of every shard of the query, as they arrive. Shards are planned while the pages of the
+        shards planned so far are fetched, and at most 2 * n_threads pages are fetched ahead of the consumer.
+        :param skip: (shard query, page) of pages that are neither yielded nor fetched, page 1 of a shard is still
+                     fetched to plan it
+        :param total: total count of the query if the caller searched it already, a total over MAX_RESULTS splits
+                      the whole range without searching it again
+        :return: generator of (shard query, page, result), items of repositories yielded before are dropped. Raises
+                 RuntimeError if a search fails.
+        """
+        fields = list(fields) if fields else None
+        if fields is not None and 'repo__id' not in fields:
+            fields.append('repo__id')
+        qualifier = SHARD_QUALIFIERS[search_option]()
+        skip = set(tuple(page) for page in skip)
+        # ranges whose first page tells whether they are split further, and pages of planned shards
+        ranges = deque([(qualifier.low, qualifier.high)])
+        if total is not None and total > MAX_RESULTS:
+            middle = (qualifier.low + qualifier.high) // 2
+            ranges = deque([(qualifier.low, middle), (middle + 1, qualifier.high)])
+        pages = deque()
+        # (shard query, page, range if the page plans a shard, future), in the order they were sent
+        in_flight = deque()
+        seen = set()
+        n_shards = 0
+        with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            while ranges or pages or in_flight:
+                # planning first, it discovers more pages to fetch
+                while len(in_flight) < 2 * self.n_threads and (ranges or pages):
+                    if ranges:
+                        low, high = ranges.popleft()
+                        query, page, shard_range = qualifier.qualify(source, low, high), 1, (low, high)
+                    else:
+                        (query, page), shard_range = pages.popleft(), None
+                    in_flight.append((query, page, shard_range, executor.submit(
+                        self.client.search, query, search_option, target, target_type, page=page, fields=fields
+                    )))
+                query, page, shard_range, future = in_flight.popleft()
+                result = future.result()
+                if not result:
+                    raise RuntimeError("search of shard `{}`, page {} failed".format(query, page))
+                if shard_range is not None:
+                    low, high = shard_range
+                    if result.total > MAX_RESULTS and low < high:
+                        middle = (low + high) // 2
+                        ranges.extend([(low, middle), (middle + 1, high)])
+                        continue
+                    if result.total > MAX_RESULTS:
+                        print("Shard `{}` has {} results and cannot be split further, only the first {} are "
+                              "retrieved.".format(query, result.total, MAX_RESULTS), file=sys.stderr)
+                    n_shards += 1
+                    pages.extend((query, shard_page)
+                                 for shard_page in range(2, min(MAX_PAGES, -(-result.total // PER_PAGE)) + 1)
+                                 if (query, shard_page) not in skip)
+                    if (query, page) in skip:
+                        continue
+                result.unique('repo__id', seen)
+                yield query, page, result
+        print("Query split into {} shards.".format(n_shards))
+
+    def search(self, source: str, search_option: str, target: str = None, target_type: str = None,
+               fields: typing.Iterable = None, total: int = None):
+        """
+        search all shards of the query
+        :param total: total count of the query if the caller searched it already, see iter_pages()
+        :return: None if a search failed, otherwise a result with one item per repository
+        """
+        results = None
+        try:
+            for _, page, page_result in self.iter_pages(source, search_option, target, target_type, fields,
+                                                        total=total):
+                if results is None:
+                    results = page_result
+                    continue
+                results.extend(page_result)
+                # page 1 of each shard tells the total of the shard
+                if page == 1:
+                    results.total += page_result.total
+        except RuntimeError as e:
+            print("Error in search of shards: {}".format(e), file=sys.stderr)
+            return None
+        return results
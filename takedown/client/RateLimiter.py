@@ -0,0 +1,178 @@
+"""
+RateLimiter
+---------------------------
+Request scheduler that paces GitHub requests by the budgets reported in the X-RateLimit-* headers.
+GitHub rate limit docs: https://docs.github.com/en/free-pro-team@latest/rest/overview/resources-in-the-rest-api#rate-limiting
+"""
+
+from .RetryPolicy import parse_retry_after
+import threading
+import time
+
+# resource: (requests per window, window in seconds) for an authenticated user
+DEFAULT_LIMITS = {
+    'search': (30, 60),
+    'core': (5000, 3600),
+    'graphql': (5000, 3600),
+}
+# once the remaining budget falls below this fraction, requests are spread evenly until the reset
+PACING_THRESHOLD = 0.25
+# GitHub asks clients to wait at least a minute after a secondary rate limit without Retry-After
+SECONDARY_LIMIT_WAIT = 60
+
+
+class RateLimit:
+    """
+    budget of one rate limit resource
+    """
+
+    def __init__(self, resource: str, limit: int, window: int):
+        self.resource = resource
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset = time.time() + window
+        self.last_sent = 0.0
+        # set by Retry-After or secondary rate limits
+        self.blocked_until = 0.0
+
+    def delay(self, now: float) -> float:
+        """
+        seconds to wait before the next request may be sent
+        :param now: current epoch time
+        :return: 0 if a request can be sent right now
+        """
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if now >= self.reset:
+            self.remaining = self.limit
+            self.reset = now + self.window
+        if self.remaining <= 0:
+            return self.reset - now
+        # burst while budget is plenty, spread the rest over the window so it is not exhausted early
+        if self.remaining <= self.limit * PACING_THRESHOLD:
+            interval = (self.reset - now) / self.remaining
+            return max(0.0, self.last_sent + interval - now)
+        return 0.0
+
+
+class RateLimiter:
+
+    def __init__(self, limits: dict = None):
+        """
+        init rate limiter
+        :param limits: { resource: (limit, window) }, DEFAULT_LIMITS by default
+        """
+        self.__lock = threading.Lock()
+        self.__limits = {
+            resource: RateLimit(resource, limit, window)
+            for resource, (limit, window) in (limits or DEFAULT_LIMITS).items()
+        }
+
+    def __get(self, resource: str) -> RateLimit:
+        if resource not in self.__limits:
+            self.__limits[resource] = RateLimit(resource, *DEFAULT_LIMITS['core'])
+        return self.__limits[resource]
+
+    def try_acquire(self, resource: str) -> float:
+        """
+        reserve one request of resource if it can be sent right now
+        :param resource: 'search' | 'core' | ...
+        :return: 0 if reserved, otherwise seconds to wait before trying again
+        """
+        with self.__lock:
+            rate = self.__get(resource)
+            now = time.time()
+            delay = rate.delay(now)
+            if delay <= 0:
+                rate.remaining -= 1
+                rate.last_sent = now
+            return max(delay, 0.0)
+
+    def acquire(self, resource: str):
+        """
+        block until one request of resource can be sent and reserve it
+        :param resource: 'search' | 'core' | ...
+        :return:
+        """
+        delay = self.try_acquire(resource)
+        while delay > 0:
+            time.sleep(delay)
+            delay = self.try_acquire(resource)
+
+    def release(self, resource: str):
+        """
+        give back a reserved request that GitHub did not count, e.g. a 304 response
+        :param resource: 'search' | 'core' | ...
+        :return:
+        """
+        with self.__lock:
+            rate = self.__get(resource)
+            rate.remaining = min(rate.remaining + 1, rate.limit)
+
+    def update(self, resource: str, response) -> bool:
+        """
+        sync the budget with headers of a response
+        :param resource: resource that the request was sent against
+        :param response: requests.Response
+        :return: true if the response was rejected by a primary or secondary rate limit
+        """
+        headers = response.headers
+        now = time.time()
+        with self.__lock:
+            rate = self.__get(resource)
+            if "X-RateLimit-Limit" in headers:
+                rate.limit = int(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Reset" in headers and "X-RateLimit-Remaining" in headers:
+                reset = int(headers["X-RateLimit-Reset"])
+                remaining = int(headers["X-RateLimit-Remaining"])
+                if reset > rate.reset + 1:
+                    # a new window started since the last response
+                    rate.remaining = remaining
+                else:
+                    # keep requests still in flight accounted for
+                    rate.remaining = min(rate.remaining, remaining)
+                rate.reset = reset
+
+            if response.status_code not in [403, 429]:
+                return False
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            if retry_after is not None:
+                rate.blocked_until = max(rate.blocked_until, now + retry_after)
+                return True
+            if headers.get("X-RateLimit-Remaining") == "0":
+                rate.remaining = 0
+                return True
+            if "rate limit" in response.text.lower():
+                rate.blocked_until = max(rate.blocked_until, now + SECONDARY_LIMIT_WAIT)
+                return True
+            return False
+
+    def sync(self, resource: str, limit: int, remaining: int, reset: int):
+        """
+        overwrite the budget of a resource, e.g. with the report of GET /rate_limit
+        :return:
+        """
+        with self.__lock:
+            rate = self.__get(resource)
+            rate.limit = limit
+            rate.remaining = remaining
+            rate.reset = reset
+
+    def remaining(self, resource: str) -> dict:
+        """
+        remaining budget of a resource
+        :param resource: 'search' | 'core' | ...
+        :return: { "limit", "remaining", "reset" }, reset is an epoch timestamp
+        """
+        with self.__lock:
+            rate = self.__get(resource)
+            rate.delay(time.time())
+            return {
+                "limit": rate.limit,
+                "remaining": max(rate.remaining, 0),
+                "reset": rate.reset
+            }
+
+    def resources(self) -> list:
+        return list(self.__limits.keys())
@@ -0,0 +1,129 @@
+"""
+ResponseCache
+---------------------------
+On-disk cache of GitHub responses used for conditional requests. A cached ETag or Last-Modified is sent back with
+the next request of the same url, and GitHub answers 304 without counting it against the rate limit if nothing
+changed, in which case the cached body is replayed.
+GitHub conditional requests docs:
+https://docs.github.com/en/free-pro-team@latest/rest/overview/resources-in-the-rest-api#conditional-requests
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+# 64 MB
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+
+class ResponseCache:
+
+    def __init__(self, path: str, max_size: int = DEFAULT_CACHE_SIZE):
+        """
+        init cache
+        :param path: directory to store cached responses, created if missing
+        :param max_size: max total bytes of cached responses, least recently used ones are evicted first
+        """
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.__size = sum(
+            os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if name.endswith(".json")
+        )
+
+    def __file(self, url: str, token: str = None) -> str:
+        # responses differ by token, but the token itself is never written to disk
+        scope = hashlib.sha256((token or "").encode()).hexdigest()
+        key = hashlib.sha256("{} {}".format(scope, url).encode()).hexdigest()
+        return os.path.join(self.path, key + ".json")
+
+    def get(self, url: str, token: str = None):
+        """
+        look up the cached response of url
+        :param url: full url including query string
+        :param token: token the request is sent with
+        :return: None | { "etag", "last_modified", "body" }
+        """
+        file_path = self.__file(url, token)
+        try:
+            with open(file_path) as file:
+                entry = json.load(file)
+            # mark as recently used
+            os.utime(file_path)
+        except (IOError, ValueError):
+            return None
+        return entry
+
+    def store(self, url: str, token: str, response):
+        """
+        cache a 200 response if GitHub provided a validator for it
+        :param url: full url including query string
+        :param token: token the request was sent with
+        :param response: requests.Response
+        :return:
+        """
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        text = json.dumps({
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": response.text
+        })
+        file_path = self.__file(url, token)
+        temp_path = "{}.{}.{}.tmp".format(file_path, os.getpid(), threading.get_ident())
+        with self.__lock:
+            previous_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+            with open(temp_path, "w") as file:
+                file.write(text)
+            # atomic, so concurrent runs never read a half written entry
+            os.replace(temp_path, file_path)
+            self.__size += os.path.getsize(file_path) - previous_size
+            if self.__size > self.max_size:
+                self.__evict()
+
+    def record(self, hit: bool):
+        with self.__lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def __evict(self):
+        """
+        drop least recently used entries until the cache is at most 3/4 full
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            stat = os.stat(os.path.join(self.path, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        self.__size = sum(entry[1] for entry in entries)
+        target = self.max_size * 3 // 4
+        for _, size, name in entries:
+            if self.__size <= target:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                continue
+            self.__size -= size
+
+    def stats(self) -> dict:
+        """
+        :return: { "hits", "misses", "size" }
+        """
+        with self.__lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": self.__size
+            }
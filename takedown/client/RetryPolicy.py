@@ -0,0 +1,96 @@
+"""
+RetryPolicy
+---------------------------
+Decides whether a failed GitHub request is worth sending again and how long to back off before doing so.
+Rate limit rejections are waited out by the RateLimiter, the policy covers transient failures such as 5xx responses,
+dropped connections and timeouts.
+"""
+
+from requests.exceptions import ConnectionError, Timeout
+import datetime
+import email.utils
+import random
+import time
+import typing
+
+# server side failures that usually succeed when sent again
+RETRYABLE_STATUS = [500, 502, 503, 504]
+DEFAULT_MAX_ATTEMPTS = 5
+# seconds
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_DEADLINE = 300.0
+DEFAULT_TIMEOUT = 30.0
+
+
+def parse_retry_after(value) -> typing.Optional[float]:
+    """
+    :param value: Retry-After header, either a number of seconds or an HTTP date
+    :return: seconds to wait, None if the value is neither
+    """
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS, deadline: float = DEFAULT_DEADLINE,
+                 base_delay: float = DEFAULT_BASE_DELAY, max_delay: float = DEFAULT_MAX_DELAY,
+                 timeout: float = DEFAULT_TIMEOUT):
+        """
+        init retry policy
+        :param max_attempts: max number of times one request is sent
+        :param deadline: max seconds spent on one request including back off, no retry is started past it
+        :param base_delay: back off of the first retry, doubled for each further retry
+        :param max_delay: cap of a single back off
+        :param timeout: seconds to wait for GitHub to respond to one attempt
+        """
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+    @staticmethod
+    def is_retryable(response=None, error: Exception = None) -> bool:
+        """
+        :param response: requests.Response of the attempt, None if it raised
+        :param error: exception raised by the attempt
+        :return: true if the failure is transient
+        """
+        if error is not None:
+            return isinstance(error, (ConnectionError, Timeout))
+        return response.status_code in RETRYABLE_STATUS
+
+    def backoff(self, attempt: int, response=None) -> float:
+        """
+        seconds to wait before the next attempt, Retry-After if GitHub sent one, otherwise exponential with full jitter
+        :param attempt: number of attempts sent so far
+        :param response: requests.Response of the last attempt
+        :return:
+        """
+        if response is not None and "Retry-After" in response.headers:
+            retry_after = parse_retry_after(response.headers["Retry-After"])
+            if retry_after is not None:
+                return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def allows(self, attempt: int, started: float, delay: float) -> bool:
+        """
+        :param attempt: number of attempts sent so far
+        :param started: epoch time of the first attempt
+        :param delay: back off before the next attempt
+        :return: true if another attempt fits in the attempt cap and the deadline
+        """
+        return attempt < self.max_attempts and time.time() + delay - started <= self.deadline
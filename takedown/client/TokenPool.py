@@ -0,0 +1,59 @@
+"""
+TokenPool
+---------------------------
+A pool of OAuth tokens, each with its own rate limit budget. Every request is sent with the token that has the
+most remaining budget, and exhausted tokens are skipped until they reset.
+"""
+
+from .RateLimiter import RateLimiter
+import threading
+import time
+
+
+class TokenPool:
+
+    def __init__(self, tokens: list = None):
+        """
+        init token pool
+        :param tokens: OAuth tokens, a pool without tokens sends anonymous requests
+        """
+        self.__lock = threading.Lock()
+        self.__limiters = {token: RateLimiter() for token in (tokens or [None])}
+
+    def tokens(self) -> list:
+        return list(self.__limiters.keys())
+
+    def limiter(self, token: str) -> RateLimiter:
+        return self.__limiters[token]
+
+    def acquire(self, resource: str):
+        """
+        block until one of the tokens can send a request of resource and reserve it
+        :param resource: 'search' | 'core' | ...
+        :return: the token to send the request with
+        """
+        while True:
+            with self.__lock:
+                candidates = sorted(
+                    self.__limiters.items(), key=lambda item: item[1].remaining(resource)["remaining"], reverse=True
+                )
+                delays = []
+                for token, limiter in candidates:
+                    delay = limiter.try_acquire(resource)
+                    if delay <= 0:
+                        return token
+                    delays.append(delay)
+            time.sleep(min(delays))
+
+    def remaining(self, resource: str) -> dict:
+        """
+        combined budget of all tokens
+        :param resource: 'search' | 'core' | ...
+        :return: { "limit", "remaining", "reset" }, reset is the earliest reset among tokens
+        """
+        budgets = [limiter.remaining(resource) for limiter in self.__limiters.values()]
+        return {
+            "limit": sum(budget["limit"] for budget in budgets),
+            "remaining": sum(budget["remaining"] for budget in budgets),
+            "reset": min(budget["reset"] for budget in budgets)
+        }
@@ -4,69 +4,163 @@ InputReader
 Input Reader that loads previous output files
 """
 
+from takedown.storage.RecordStore import RecordStore, is_record_store
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import yaml
 import json
+import os
+import sys
+import typing
 
+# libyaml parses several times faster than the pure Python parser, when PyYAML was built with it
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+JSON_EXTENSIONS = (".json",)
+YAML_EXTENSIONS = (".yaml", ".yml")
 
-def load_previous_outputs_as_inputs(file_paths: list) -> dict:
-    print("Start loading input files...")
-    previous_records = {}
-    for file_path in file_paths:
-        print("Loading {}...".format(file_path))
-        # start reading files
-        data = None
-        # try yaml and json
-        input_stream = None
+
+def merge_repos(record: dict, repos: typing.Iterable):
+    """
+    merge repos into the record of their owner, the one scanned latest wins
+    :param record: record with repos as { repo__name: repo }
+    :param repos: iterable of repos of the same owner
+    :return:
+    """
+    for repo_object in repos:
+        # update to the latest scanned ones
+        repo_name = repo_object["repo__name"]
+        if repo_name in record["repos"]:
+            if str(repo_object["date"]) > str(record["repos"][repo_name]["date"]):
+                record["repos"][repo_name]["date"] = repo_object["date"]
+                record["repos"][repo_name]["status"] = repo_object["status"]
+        # or add the repos if no collision
+        else:
+            record["repos"][repo_name] = {
+                **repo_object
+            }
+
+
+def load_output_file(file_path: str):
+    """
+    load an output file of find or send. The format is told by the file extension, or else by the first character
+    of the file, and the other format is only tried if parsing fails. JSON is valid YAML, but the JSON parser is
+    much faster, so a JSON file never goes through the YAML parser first.
+    :param file_path: path of the output file
+    :return: the data of the file, None if it is neither yaml nor json
+    """
+    try:
+        with open(file_path) as input_stream:
+            text = input_stream.read()
+    except OSError as e:
+        print("Reading {} failed: {}".format(file_path, str(e)), file=sys.stderr)
+        return None
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in JSON_EXTENSIONS:
+        formats = ["json", "yaml"]
+    elif extension in YAML_EXTENSIONS:
+        formats = ["yaml", "json"]
+    else:
+        # json output always starts with an object
+        formats = ["json", "yaml"] if text.lstrip()[:1] in ("{", "[") else ["yaml", "json"]
+    for file_format in formats:
         try:
-            input_stream = open(file_path)
-            data = yaml.safe_load(input_stream)
-            print("{} successfully loaded as yaml file.".format(file_path))
-            input_stream.close()
-        except yaml.YAMLError:
-            if input_stream:
-                input_stream.close()
-            data = None
-        if not data:
-            try:
-                input_stream = open(file_path)
-                data = json.load(input_stream)
-                print("{} successfully loaded as json file.".format(file_path))
-                input_stream.close()
-            except json.JSONDecodeError:
-                if input_stream:
-                    input_stream.close()
-                data = None
-        if not data or not isinstance(data, dict):
-            print("Loading {} failed both in yaml and json. Skipped.".format(file_path))
+            if file_format == "json":
+                data = json.loads(text)
+            else:
+                data = yaml.load(text, Loader=YAML_LOADER)
+        except (json.JSONDecodeError, yaml.YAMLError):
             continue
+        if data:
+            print("{} successfully loaded as {} file.".format(file_path, file_format))
+            return data
+    return None
+
+
+def load_partial_records(file_path: str) -> typing.Optional[dict]:
+    """
+    load an output file and reduce it to the records of its owners, run in a worker process
+    :param file_path: path of the output file
+    :return: { owner__username: record } of the file, None if the file cannot be loaded
+    """
+    print("Loading {}...".format(file_path))
+    data = load_output_file(file_path)
+    if not data or not isinstance(data, dict):
+        print("Loading {} failed both in yaml and json. Skipped.".format(file_path))
+        return None
+    records = {}
+    for user_dict in data["results"]:
+        if user_dict["owner__username"] not in records:
+            records[user_dict["owner__username"]] = {**user_dict, "repos": {}}
+        merge_repos(records[user_dict["owner__username"]], user_dict["repos"])
+    return records
 
-        # read data into dict and merge data if necessary
-        for user_dict in data["results"]:
-            if user_dict["owner__username"] in previous_records:
-                to_merge_user_object = previous_records[user_dict["owner__username"]]
-                # iterate all repos in data
-                for repo_object in user_dict["repos"]:
-                    # update to the latest scanned ones
-                    repo_name = repo_object["repo__name"]
-                    if repo_name in to_merge_user_object["repos"]:
-                        if repo_object["date"] > \
-                                to_merge_user_object["repos"][repo_name]["date"]:
-                            to_merge_user_object["repos"][repo_name]["date"] = \
-                                repo_object["date"]
-                            to_merge_user_object["repos"][repo_name]["status"] = repo_object["status"]
-                    # or add the repos if no collision
-                    else:
-                        to_merge_user_object["repos"][repo_name] = {
-                            **repo_object
-                        }
-            else:
-                previous_records[user_dict["owner__username"]] = {
-                    **user_dict,
-                    "repos": {
-                        repo_object["repo__name"]: {**repo_object} for repo_object in user_dict["repos"]
-                    }
-                }
+
+def merge_records(records: dict, later_records: dict) -> dict:
+    """
+    merge records into the records of the files given before them. An owner keeps the profile read first, and each
+    repo the status scanned latest.
+    :param records: { owner__username: record }, updated in place
+    :param later_records: { owner__username: record }
+    :return: records
+    """
+    for username, record in later_records.items():
+        if username in records:
+            merge_repos(records[username], record["repos"].values())
+        else:
+            records[username] = record
+    return records
+
+
+def load_partials(file_paths: list) -> list:
+    """
+    :param file_paths: paths of output files
+    :return: partial records of each file in the order of the files, None for files that cannot be loaded
+    """
+    max_workers = min(len(file_paths), os.cpu_count() or 1)
+    # a pool only pays for starting its processes with several files and several cores to parse them on
+    if max_workers < 2:
+        return [load_partial_records(file_path) for file_path in file_paths]
+    # files are parsed concurrently, parsing is CPU bound so each file goes to a process of its own
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(load_partial_records, file_paths))
+    except (OSError, NotImplementedError, BrokenProcessPool) as e:
+        print("Loading input files in parallel failed: {}. Load them one by one.".format(str(e)), file=sys.stderr)
+        return [load_partial_records(file_path) for file_path in file_paths]
+
+
+def load_previous_outputs_as_inputs(file_paths: list) -> typing.Union[dict, RecordStore]:
+    """
+    load records from output files of find and send. If one of the files is a record store, the other files are
+    merged into the store, and the store is returned to be read lazily.
+    :param file_paths: paths of output files or of a record store
+    :return: { owner__username: record } | RecordStore
+    """
+    print("Start loading input files...")
+    store = None
+    for file_path in file_paths:
+        if is_record_store(file_path):
+            print("Opening record store {}...".format(file_path))
+            store = RecordStore(file_path)
+    partials = [partial for partial in load_partials([file_path for file_path in file_paths
+                                                      if not is_record_store(file_path)]) if partial is not None]
+    # tree merge of neighbouring files, each level halves the number of partial records
+    while len(partials) > 1:
+        merged = [merge_records(partials[index], partials[index + 1]) for index in range(0, len(partials) - 1, 2)]
+        if len(partials) % 2:
+            merged.append(partials[-1])
+        partials = merged
+    previous_records = partials[0] if partials else {}
+
+    if store is not None:
+        # files are imported into the store, records already stored keep their repos scanned later
+        for username, record in previous_records.items():
+            if username in store:
+                merge_repos(store[username], record["repos"].values())
+                previous_records[username] = store[username]
+        store.save(previous_records)
+        print("Inputs loading finished. {} records imported into the store.".format(len(previous_records)))
+        return store
 
     print("Inputs loading finished.")
     return previous_records
-
@@ -8,6 +8,16 @@ import sys
 import os
 import configparser
 import takedown
+from takedown.storage.RecordStore import is_record_store
+
+
+def read_queries(file_path) -> list:
+    """
+    read search queries from a file, one query per line. Blank lines and lines starting with '#' are skipped
+    :return: list of queries
+    """
+    with open(file_path) as file:
+        return [line.strip() for line in file if line.strip() and not line.strip().startswith("#")]
 
 
 def check_file(file_path, mode="r"):
@@ -61,7 +71,7 @@ class InputReader:
         return False
 
     def parse_config_file(self):
-        if self.command_type == "find":
+        if self.command_type in ["find", "monitor"]:
             return self.__parse_config_file_find()
         elif self.command_type == "send":
             return self.__parse_config_file_send()
@@ -115,7 +125,8 @@ class InputReader:
         if "inputs" in optional_params:
             files = optional_params["inputs"].split("+")
             for file in files:
-                if not check_file(file):
+                # a record store that does not exist yet is created
+                if not check_file(file) and not is_record_store(file):
                     self.parse_error_msg = "File path '{}' cannot be accessed.".format(file)
                     return False
             self.optional_inputs["inputs"] = files
@@ -131,6 +142,96 @@ class InputReader:
                 self.parse_error_msg = "Unrecognized file format. Please check 'help' for details"
                 return False
             self.optional_inputs["format"] = output_format
+        if "query_file" in optional_params:
+            file = optional_params["query_file"]
+            if not check_file(file):
+                self.parse_error_msg = "Query file path '{}' cannot be accessed.".format(file)
+                return False
+            self.optional_inputs["queries"] = read_queries(file)
+        if "incremental" in optional_params:
+            self.optional_inputs["incremental"] = optional_params["incremental"]
+        if self.command_type == "monitor" and "interval" in optional_params:
+            interval = optional_params["interval"]
+            if not interval.isdigit() or int(interval) == 0:
+                self.parse_error_msg = "Interval must be a positive number of minutes."
+                return False
+            self.optional_inputs["interval"] = int(interval) * 60
+        if self.command_type == "monitor" and "sweeps" in optional_params:
+            sweeps = optional_params["sweeps"]
+            if not sweeps.isdigit() or int(sweeps) == 0:
+                self.parse_error_msg = "Number of sweeps must be a positive integer."
+                return False
+            self.optional_inputs["sweeps"] = int(sweeps)
+        if "checkpoint" in optional_params:
+            self.optional_inputs["checkpoint"] = optional_params["checkpoint"]
+        if "seen_index" in optional_params:
+            self.optional_inputs["seen_index"] = optional_params["seen_index"]
+        if "resume" in optional_params:
+            if optional_params["resume"].lower() not in ["yes", "no"]:
+                self.parse_error_msg = "Resume must be 'yes' or 'no'."
+                return False
+            self.optional_inputs["resume"] = optional_params["resume"].lower() == "yes"
+        if "pool_size" in optional_params:
+            pool_size = optional_params["pool_size"]
+            if not pool_size.isdigit() or int(pool_size) == 0:
+                self.parse_error_msg = "Pool size must be a positive integer."
+                return False
+            self.optional_inputs["pool_size"] = int(pool_size)
+        if "n_threads" in optional_params:
+            n_threads = optional_params["n_threads"]
+            if not n_threads.isdigit() or int(n_threads) == 0:
+                self.parse_error_msg = "Number of threads must be a positive integer."
+                return False
+            self.optional_inputs["n_threads"] = int(n_threads)
+        if "cache_path" in optional_params:
+            self.optional_inputs["cache_path"] = optional_params["cache_path"]
+        if "cache_size" in optional_params:
+            cache_size = optional_params["cache_size"]
+            if not cache_size.isdigit() or int(cache_size) == 0:
+                self.parse_error_msg = "Cache size must be a positive integer."
+                return False
+            # MB in config file
+            self.optional_inputs["cache_size"] = int(cache_size) * 1024 * 1024
+        if "max_attempts" in optional_params:
+            max_attempts = optional_params["max_attempts"]
+            if not max_attempts.isdigit() or int(max_attempts) == 0:
+                self.parse_error_msg = "Max attempts must be a positive integer."
+                return False
+            self.optional_inputs["max_attempts"] = int(max_attempts)
+        if "retry_deadline" in optional_params:
+            retry_deadline = optional_params["retry_deadline"]
+            if not retry_deadline.isdigit():
+                self.parse_error_msg = "Retry deadline must be a number of seconds."
+                return False
+            self.optional_inputs["retry_deadline"] = int(retry_deadline)
+        if "enrich_threads" in optional_params:
+            enrich_threads = optional_params["enrich_threads"]
+            if not enrich_threads.isdigit() or int(enrich_threads) == 0:
+                self.parse_error_msg = "Number of threads must be a positive integer."
+                return False
+            self.optional_inputs["enrich_threads"] = int(enrich_threads)
+        if "owner_cache" in optional_params:
+            self.optional_inputs["owner_cache"] = optional_params["owner_cache"]
+        if "owner_cache_ttl" in optional_params:
+            owner_cache_ttl = optional_params["owner_cache_ttl"]
+            if not owner_cache_ttl.isdigit():
+                self.parse_error_msg = "Owner cache TTL must be a number of days."
+                return False
+            self.optional_inputs["owner_cache_ttl"] = int(owner_cache_ttl) * 24 * 3600
+        if "record_ttl" in optional_params:
+            record_ttl = optional_params["record_ttl"]
+            if not record_ttl.isdigit():
+                self.parse_error_msg = "Record TTL must be a number of days."
+                return False
+            self.optional_inputs["record_ttl"] = int(record_ttl) * 24 * 3600
+        if "history_retention" in optional_params:
+            history_retention = optional_params["history_retention"]
+            if not history_retention.isdigit():
+                self.parse_error_msg = "History retention must be a number of days."
+                return False
+            self.optional_inputs["history_retention"] = int(history_retention) * 24 * 3600
+        if "history_archive" in optional_params:
+            self.optional_inputs["history_archive"] = optional_params["history_archive"]
 
         return True
 
@@ -240,6 +341,8 @@ class InputReader:
             return False
         if self.raw_input[1] == "find":
             return self.__command_find()
+        elif self.raw_input[1] == "monitor":
+            return self.__command_find("monitor")
         elif self.raw_input[1] == "send":
             return self.__command_send()
         else:
@@ -250,12 +353,12 @@ class InputReader:
         print(takedown.DESCRIPTION)
         print(takedown.CONTRIBUTORS_INFO)
 
-    def __command_find(self):
+    def __command_find(self, command_type: str = "find"):
         """
-        Command validator and parser for "takedown find"
+        Command validator and parser for "takedown find", and "takedown monitor" which takes the same parameters
         :return: true if commands are correct; false if failed
         """
-        self.command_type = "find"
+        self.command_type = command_type
 
         # check config files
         if self.has_config():
@@ -293,7 +396,8 @@ class InputReader:
                 else:
                     files = self.raw_input[curr + 1].split("+")
                     for file in files:
-                        if not check_file(file):
+                        # a record store that does not exist yet is created
+                        if not check_file(file) and not is_record_store(file):
                             self.parse_error_msg = "File path '{}' cannot be accessed.".format(file)
                             return False
                     self.optional_inputs["inputs"] = files
@@ -317,12 +421,100 @@ class InputReader:
                         self.parse_error_msg = "Unrecognized file format. Please check 'help' for details"
                         return False
                     self.optional_inputs["format"] = output_format
+            elif self.raw_input[curr] == '-q':
+                if curr == length - 1:
+                    self.parse_error_msg = "Missing target after flag '-q'"
+                    return False
+                else:
+                    file = self.raw_input[curr + 1]
+                    if not check_file(file):
+                        self.parse_error_msg = "Query file path '{}' cannot be accessed.".format(file)
+                        return False
+                    self.optional_inputs["queries"] = read_queries(file)
+            elif self.raw_input[curr] == '-inc':
+                if curr == length - 1:
+                    self.parse_error_msg = "Missing target after flag '-inc'"
+                    return False
+                else:
+                    self.optional_inputs["incremental"] = self.raw_input[curr + 1]
+            elif self.raw_input[curr] == '-iv' and self.command_type == "monitor":
+                if curr == length - 1:
+                    self.parse_error_msg = "Missing target after flag '-iv'"
+                    return False
+                else:
+                    interval = self.raw_input[curr + 1]
+                    if not interval.isdigit() or int(interval) == 0:
+                        self.parse_error_msg = "Interval must be a positive number of minutes."
+                        return False
+                    self.optional_inputs["interval"] = int(interval) * 60
+            elif self.raw_input[curr] == '-sw' and self.command_type == "monitor":
+                if curr == length - 1:
+                    self.parse_error_msg = "Missing target after flag '-sw'"
+                    return False
+                else:
+                    sweeps = self.raw_input[curr + 1]
+                    if not sweeps.isdigit() or int(sweeps) == 0:
+                        self.parse_error_msg = "Number of sweeps must be a positive integer."
+                        return False
+                    self.optional_inputs["sweeps"] = int(sweeps)
+            elif self.raw_input[curr] == '-cp':
+                if curr == length - 1:
+                    self.parse_error_msg = "Missing target after flag '-cp'"
+                    return False
+                else:
+                    self.optional_inputs["checkpoint"] = self.raw_input[curr + 1]
+            elif self.raw_input[curr] == '-si':
+                if curr == length - 1:
+                    self.parse_error_msg = "Missing target after flag '-si'"
+                    return False
+                else:
+                    self.optional_inputs["seen_index"] = self.raw_input[curr + 1]
+            elif self.raw_input[curr] == '--resume':
+                # a switch without value
+                self.optional_inputs["resume"] = True
+                curr += 1
+                continue
+            elif self.raw_input[curr] == '-ps':
+                if curr == length - 1:
+                    self.parse_error_msg = "Missing target after flag '-ps'"
+                    return False
+                else:
+                    pool_size = self.raw_input[curr + 1]
+                    if not pool_size.isdigit() or int(pool_size) == 0:
+                        self.parse_error_msg = "Pool size must be a positive integer."
+                        return False
+                    self.optional_inputs["pool_size"] = int(pool_size)
+            elif self.raw_input[curr] == '-n':
+                if curr == length - 1:
+                    self.parse_error_msg = "Missing target after flag '-n'"
+                    return False
+                else:
+                    n_threads = self.raw_input[curr + 1]
+                    if not n_threads.isdigit() or int(n_threads) == 0:
+                        self.parse_error_msg = "Number of threads must be a positive integer."
+                        return False
+                    self.optional_inputs["n_threads"] = int(n_threads)
+            elif self.raw_input[curr] == '-ca':
+                if curr == length - 1:
+                    self.parse_error_msg = "Missing target after flag '-ca'"
+                    return False
+                else:
+                    self.optional_inputs["cache_path"] = self.raw_input[curr + 1]
+            elif self.raw_input[curr] == '-oc':
+                if curr == length - 1:
+                    self.parse_error_msg = "Missing target after flag '-oc'"
+                    return False
+                else:
+                    self.optional_inputs["owner_cache"] = self.raw_input[curr + 1]
             else:
                 # skip unrecognized input
                 curr += 1
                 continue
             curr += 2
 
+        if self.optional_inputs.get("resume") and "checkpoint" not in self.optional_inputs:
+            self.parse_error_msg = "Flag '--resume' requires a checkpoint file given by '-cp'."
+            return False
         print("Checked optional parameters.")
         return True
 
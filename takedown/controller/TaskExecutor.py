@@ -5,7 +5,20 @@ The class that handles task init, prep, and execution
 """
 
 from takedown.task.FindRepoTask import FindRepoTask
+from takedown.task.MonitorTask import MonitorTask
 from takedown.task.SendEmailTask import SendEmailTask
+from .OutputParser import parse_final_results
+import datetime
+import os
+
+# optional parameters of find that configure the task itself
+FIND_CONFIG_KEYS = ["pool_size", "n_threads", "cache_path", "cache_size", "max_attempts", "retry_deadline",
+                    "enrich_threads", "owner_cache", "owner_cache_ttl",
+                    "record_ttl", "incremental", "checkpoint", "resume", "seen_index",
+                    "history_retention", "history_archive"]
+
+# optional parameters of monitor on top of the ones of find
+MONITOR_CONFIG_KEYS = ["interval", "sweeps"]
 
 
 class TaskExecutor:
@@ -22,7 +35,15 @@ class TaskExecutor:
     def prepare(self, task_type: str, required_parameters: dict, optional_parameters: dict, **kwargs):
         if task_type == "find":
             self.type = "find"
-            self.task = FindRepoTask()
+            self.task = FindRepoTask(**{
+                key: optional_parameters[key] for key in FIND_CONFIG_KEYS if key in optional_parameters
+            })
+        elif task_type == "monitor":
+            self.type = "monitor"
+            self.task = MonitorTask(**{
+                key: optional_parameters[key] for key in FIND_CONFIG_KEYS + MONITOR_CONFIG_KEYS
+                if key in optional_parameters
+            })
         elif task_type == "send":
             self.type = "send"
             self.task = SendEmailTask()
@@ -40,11 +61,19 @@ class TaskExecutor:
 
         if self.type == "find":
             self.execution_results = self.task.prepare(
-                self.required_parameters["GitHub_token"],
-                self.required_parameters["search_query"],
+                self.required_parameters["GitHub_token"].split("+"),
+                [self.required_parameters["search_query"]] + self.optional_parameters.get("queries", []),
                 self.optional_parameters.get("inputs", None)
             ).execute(targets=self.optional_parameters.get("targets", None), chain=False)
             return self.execution_results is not None
+        elif self.type == "monitor":
+            self.execution_results = self.task.prepare(
+                self.required_parameters["GitHub_token"].split("+"),
+                [self.required_parameters["search_query"]] + self.optional_parameters.get("queries", []),
+                self.optional_parameters.get("inputs", None),
+                self.optional_parameters.get("targets", None)
+            ).execute(on_delta=self.write_delta)
+            return self.execution_results is not None
         elif self.type == "send":
             self.execution_results = self.task.prepare(
                 self.required_parameters,
@@ -53,3 +82,15 @@ class TaskExecutor:
             return self.execution_results is not None
 
         return False
+
+    def write_delta(self, delta: dict):
+        """
+        output the delta of a monitor sweep, to a new file next to the output path stamped with the sweep time
+        :param delta: records of the repos new or changed in the sweep
+        :return:
+        """
+        output_path = self.optional_parameters.get("output", None)
+        if output_path:
+            stem, extension = os.path.splitext(output_path)
+            output_path = "{}-{}{}".format(stem, datetime.datetime.now().strftime("%Y%m%d-%H%M%S"), extension)
+        parse_final_results(delta, self.optional_parameters.get("format", "yaml"), output_path)
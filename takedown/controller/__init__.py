@@ -44,6 +44,10 @@ class MainController:
         executor = TaskExecutor()
         executor.prepare(reader.command_type, required_params, optional_params).execute()
         final_results = executor.execution_results
+        if reader.command_type == "monitor":
+            # deltas are output after every sweep
+            print("Monitor stopped.")
+            return final_results is not None
         if not final_results:
             return False
 
@@ -0,0 +1,93 @@
+"""
+Checkpoint
+--------------------------------------------------
+State file of a find run, saved as the run goes so a run that dies can be resumed. The file is a journal of JSON
+lines: a full state written by save(), followed by the changes of each page appended by append(), so saving a page
+costs as much as the page and not as much as the whole run. save() replaces the file atomically, an interrupted save
+leaves the previous checkpoint intact, and a line cut short by a crash is ignored. Dates of records read from YAML
+files are saved as their text, the way output files write them.
+
+State and changes share one shape:
+    searches: { "target:query": { "pages", "done" } }, progress of each search
+    shard_pages: { "target:query": [[shard query, page]] }, shard pages grouped, appended to the ones saved before
+    results: { owner__username: record }, records replacing the ones saved before
+    repos: { repo__id: [owner__username, repo__name] }
+    profiles: { owner__url: profile }
+"""
+
+import json
+import os
+import sys
+
+STATE_KEYS = ("searches", "shard_pages", "results", "repos", "profiles")
+
+
+class Checkpoint:
+
+    def __init__(self, path: str):
+        """
+        init checkpoint
+        :param path: path of the state file
+        """
+        self.path = path
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self):
+        """
+        :return: None if there is no readable checkpoint, otherwise the saved state with every change applied
+        """
+        if not self.exists():
+            return None
+        state = {key: {} for key in STATE_KEYS}
+        try:
+            with open(self.path) as file:
+                lines = file.readlines()
+        except IOError as e:
+            print("Checkpoint {} cannot be loaded: {}".format(self.path, e), file=sys.stderr)
+            return None
+        for number, line in enumerate(lines):
+            try:
+                changes = json.loads(line)
+            except json.JSONDecodeError as e:
+                # only the last line can be cut short by a crash while it was appended
+                if number == len(lines) - 1 and number > 0:
+                    break
+                print("Checkpoint {} cannot be loaded: {}".format(self.path, e), file=sys.stderr)
+                return None
+            for search_key, progress in changes.get("searches", {}).items():
+                state["searches"].setdefault(search_key, {}).update(progress)
+            for search_key, pages in changes.get("shard_pages", {}).items():
+                state["shard_pages"].setdefault(search_key, []).extend(pages)
+            for key in ("results", "repos", "profiles"):
+                state[key].update(changes.get(key, {}))
+        return state
+
+    def save(self, state: dict):
+        """
+        write the whole state, dropping the changes appended before
+        :param state: dict of STATE_KEYS, values json serializable or dates
+        :return:
+        """
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w+") as file:
+            file.write(json.dumps(state, default=str) + "\n")
+        os.replace(temp_path, self.path)
+
+    def append(self, changes: dict):
+        """
+        append the changes of a page to the state
+        :param changes: dict of some of STATE_KEYS, values json serializable or dates
+        :return:
+        """
+        with open(self.path, "a") as file:
+            file.write(json.dumps(changes, default=str) + "\n")
+
+    def clear(self):
+        """
+        remove the state file once the run finished
+        :return:
+        """
+        if self.exists():
+            os.remove(self.path)
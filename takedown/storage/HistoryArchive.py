@@ -0,0 +1,139 @@
+"""
+HistoryArchive
+--------------------------------------------------
+Bounded status history of repos
+    1. Repeated "Redetected" entries are run-length encoded into one entry, with the date of the first one, the date
+       of the last one as "last_date" and their number as "count"
+    2. Entries older than the retention window are moved out of the records into a cold archive file of JSON lines,
+       which is only read when archived history is asked for, through HistoryArchive(path).load(username, repo_name)
+"""
+
+import datetime
+import json
+import os
+import typing
+
+# status whose repeated entries are run-length encoded
+REDETECTED = "Redetected"
+
+
+def append_history(history: list, status: str, date):
+    """
+    append an entry to a history, merged into the last entry if both are redetections
+    :param history: list of history entries
+    :param status: status of the entry
+    :param date: date of the entry
+    :return:
+    """
+    if status == REDETECTED and history and history[-1].get("status") == REDETECTED:
+        last = history[-1]
+        last["last_date"] = date
+        last["count"] = last.get("count", 1) + 1
+    else:
+        history.append({
+            "date": date,
+            "status": status
+        })
+
+
+def compact_history(history: list) -> list:
+    """
+    :param history: list of history entries, possibly compacted already
+    :return: the history with repeated redetections merged
+    """
+    compacted = []
+    for entry in history:
+        if entry.get("status") == REDETECTED and compacted and compacted[-1].get("status") == REDETECTED:
+            last = compacted[-1]
+            last["last_date"] = entry.get("last_date", entry.get("date"))
+            last["count"] = last.get("count", 1) + entry.get("count", 1)
+        else:
+            compacted.append({**entry})
+    return compacted
+
+
+def entry_date(entry: dict) -> typing.Optional[datetime.datetime]:
+    """
+    :param entry: history entry
+    :return: date of the latest event of the entry in local time, None if it is not a date
+    """
+    date = entry.get("last_date", entry.get("date"))
+    if not isinstance(date, datetime.datetime):
+        try:
+            date = datetime.datetime.fromisoformat(str(date))
+        except ValueError:
+            return None
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)
+    return date
+
+
+class HistoryArchive:
+
+    def __init__(self, path: str = None, retention: float = None):
+        """
+        init archive
+        :param path: path of the archive file, entries out of the retention window are dropped without one
+        :param retention: seconds of history kept in records, all of it by default
+        """
+        self.path = path
+        self.retention = retention
+
+    def trim(self, records: dict) -> int:
+        """
+        compact the history of records and move the entries out of the retention window to the archive
+        :param records: { owner__username: record } with repos as { repo__name: repo }
+        :return: number of entries moved out of the records
+        """
+        cutoff = None
+        if self.retention is not None:
+            cutoff = datetime.datetime.now() - datetime.timedelta(seconds=self.retention)
+        archived = []
+        for username, record in records.items():
+            for repo_name, repo in record["repos"].items():
+                if not repo.get("history"):
+                    continue
+                history = compact_history(repo["history"])
+                if cutoff is not None:
+                    # entries are in order, the old ones are a prefix
+                    split = 0
+                    while split < len(history):
+                        date = entry_date(history[split])
+                        if date is None or date >= cutoff:
+                            break
+                        split += 1
+                    if split:
+                        archived.append({
+                            "owner__username": username,
+                            "repo__name": repo_name,
+                            "history": history[:split]
+                        })
+                        history = history[split:]
+                repo["history"] = history
+        if archived and self.path:
+            with open(self.path, "a") as file:
+                for line in archived:
+                    file.write(json.dumps(line, default=str) + "\n")
+        return sum(len(line["history"]) for line in archived)
+
+    def load(self, username: str = None, repo_name: str = None) -> dict:
+        """
+        read archived history
+        :param username: only the history of repos of this owner, all owners by default
+        :param repo_name: only the history of this repo, all repos by default
+        :return: { (owner__username, repo__name): [archived entries, oldest first] }
+        """
+        history = {}
+        if not self.path or not os.path.exists(self.path):
+            return history
+        with open(self.path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if username is not None and entry["owner__username"] != username:
+                    continue
+                if repo_name is not None and entry["repo__name"] != repo_name:
+                    continue
+                history.setdefault((entry["owner__username"], entry["repo__name"]), []).extend(entry["history"])
+        return history
@@ -0,0 +1,113 @@
+"""
+OwnerCache
+--------------------------------------------------
+Persistent cache of owner profiles backed by SQLite, shared by runs of find and safe across concurrent processes.
+Only the fields used by the tasks are stored. Profiles without a public email expire sooner, so owners who publish one
+are picked up again quickly.
+"""
+
+import sqlite3
+import threading
+import time
+import typing
+
+# seconds
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_NEGATIVE_TTL = 24 * 3600
+DEFAULT_MAX_ENTRIES = 100000
+# seconds to wait for another process holding the database lock
+LOCK_TIMEOUT = 30
+
+
+class OwnerCache:
+
+    def __init__(self, path: str, ttl: int = DEFAULT_TTL, negative_ttl: int = DEFAULT_NEGATIVE_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        open or create the cache
+        :param path: path of the SQLite database file
+        :param ttl: seconds a profile stays valid
+        :param negative_ttl: seconds a profile without email stays valid
+        :param max_entries: oldest profiles are evicted beyond this number
+        """
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+        with self.__lock, self.__connection:
+            # readers are not blocked by a writing process
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS owners ("
+                "login_key TEXT PRIMARY KEY, login TEXT, owner_id INTEGER, name TEXT, email TEXT, html_url TEXT, "
+                "fetched_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.__connection.execute("CREATE INDEX IF NOT EXISTS owners_owner_id ON owners (owner_id)")
+            self.__connection.execute("CREATE INDEX IF NOT EXISTS owners_fetched_at ON owners (fetched_at)")
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+    def get_many(self, owners: typing.Iterable) -> dict:
+        """
+        look up valid profiles
+        :param owners: iterable of (login, owner_id), owner_id may be None
+        :return: { login: profile shaped as GitHubClient.get_user() }, unknown and expired owners are omitted
+        """
+        owners = list(owners)
+        if not owners:
+            return {}
+        now = time.time()
+        profiles = {}
+        with self.__lock:
+            for start in range(0, len(owners), 500):
+                batch = owners[start:start + 500]
+                rows = self.__connection.execute(
+                    "SELECT login_key, login, owner_id, name, email, html_url FROM owners "
+                    "WHERE login_key IN ({}) AND expires_at > ?".format(", ".join("?" * len(batch))),
+                    [login.lower() for login, _ in batch] + [now]
+                ).fetchall()
+                ids = {login.lower(): owner_id for login, owner_id in batch}
+                for login_key, login, owner_id, name, email, html_url in rows:
+                    # a login taken over by another account is not the same owner
+                    if ids[login_key] is not None and owner_id is not None and ids[login_key] != owner_id:
+                        continue
+                    profiles[login_key] = {
+                        "login": login,
+                        "id": owner_id,
+                        "name": name,
+                        "email": email,
+                        "html_url": html_url
+                    }
+        return {login: profiles[login.lower()] for login, _ in owners if login.lower() in profiles}
+
+    def put_many(self, profiles: typing.Iterable):
+        """
+        store profiles
+        :param profiles: iterable of (owner_id, profile), owner_id may be None
+        :return:
+        """
+        now = time.time()
+        rows = [
+            (profile["login"].lower(), profile["login"], owner_id if owner_id is not None else profile.get("id"),
+             profile.get("name"), profile.get("email"), profile.get("html_url"), now,
+             now + (self.ttl if profile.get("email") else self.negative_ttl))
+            for owner_id, profile in profiles if profile and profile.get("login")
+        ]
+        if not rows:
+            return
+        with self.__lock, self.__connection:
+            self.__connection.executemany("INSERT OR REPLACE INTO owners VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.__evict(now)
+
+    def __evict(self, now: float):
+        self.__connection.execute("DELETE FROM owners WHERE expires_at <= ?", [now])
+        count = self.__connection.execute("SELECT COUNT(*) FROM owners").fetchone()[0]
+        if count > self.max_entries:
+            self.__connection.execute(
+                "DELETE FROM owners WHERE login_key IN (SELECT login_key FROM owners ORDER BY fetched_at LIMIT ?)",
+                [count - self.max_entries]
+            )
@@ -0,0 +1,220 @@
+"""
+RecordStore
+--------------------------------------------------
+Records of owners, their repos and the status history of each repo kept in SQLite. The store reads like the
+{ owner__username: record } dict loaded from output files, but a record is only read from the database when it is
+looked up, and only the records passed to save() are written back.
+"""
+
+from collections.abc import Mapping
+import json
+import sqlite3
+import threading
+import typing
+
+# seconds to wait for another process holding the database lock
+LOCK_TIMEOUT = 30
+# file extensions of record stores, other input files are outputs of find or send
+STORE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+# max number of usernames bound to one query, below the SQLite limit of 999 variables
+QUERY_CHUNK_SIZE = 500
+
+
+def is_record_store(file_path: str) -> bool:
+    return file_path.lower().endswith(STORE_EXTENSIONS)
+
+
+class RecordStore(Mapping):
+
+    def __init__(self, path: str):
+        """
+        open or create the store
+        :param path: path of the SQLite database file
+        """
+        self.path = path
+        # owner__username: record, records read or saved by this process
+        self.__records = {}
+        self.__lock = threading.RLock()
+        self.__connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+        with self.__lock, self.__connection:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS owners ("
+                "username TEXT PRIMARY KEY, name TEXT, emails TEXT, html_url TEXT)"
+            )
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS repos ("
+                "repo_key INTEGER PRIMARY KEY, username TEXT NOT NULL, repo_name TEXT NOT NULL, repo_html_url TEXT, "
+                "status TEXT, date TEXT, queries TEXT, UNIQUE (username, repo_name))"
+            )
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "repo_key INTEGER NOT NULL, position INTEGER NOT NULL, status TEXT, date TEXT, "
+                "last_date TEXT, count INTEGER, PRIMARY KEY (repo_key, position))"
+            )
+            # stores created before redetections were run-length encoded
+            columns = [row[1] for row in self.__connection.execute("PRAGMA table_info(history)")]
+            if "count" not in columns:
+                self.__connection.execute("ALTER TABLE history ADD COLUMN last_date TEXT")
+                self.__connection.execute("ALTER TABLE history ADD COLUMN count INTEGER")
+            # repos are looked up by owner through the unique index
+            self.__connection.execute("CREATE INDEX IF NOT EXISTS repos_repo_name ON repos (repo_name)")
+            self.__connection.execute("CREATE INDEX IF NOT EXISTS repos_status ON repos (status COLLATE NOCASE)")
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+    def __getitem__(self, username: str) -> dict:
+        with self.__lock:
+            if username not in self.__records:
+                record = self.__read(username)
+                if record is None:
+                    raise KeyError(username)
+                self.__records[username] = record
+            return self.__records[username]
+
+    def __contains__(self, username) -> bool:
+        with self.__lock:
+            if username in self.__records:
+                return True
+            return self.__connection.execute(
+                "SELECT 1 FROM owners WHERE username = ?", [username]
+            ).fetchone() is not None
+
+    def __iter__(self):
+        with self.__lock:
+            usernames = [row[0] for row in self.__connection.execute("SELECT username FROM owners")]
+        return iter(usernames)
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__connection.execute("SELECT COUNT(*) FROM owners").fetchone()[0]
+
+    def __read(self, username: str):
+        owner = self.__connection.execute(
+            "SELECT name, emails, html_url FROM owners WHERE username = ?", [username]
+        ).fetchone()
+        if owner is None:
+            return None
+        name, emails, html_url = owner
+        repos = {}
+        keys = {}
+        for repo_key, repo_name, repo_html_url, status, date, queries in self.__connection.execute(
+                "SELECT repo_key, repo_name, repo_html_url, status, date, queries FROM repos WHERE username = ?",
+                [username]):
+            repos[repo_name] = {
+                "repo__name": repo_name,
+                "repo__html_url": repo_html_url,
+                "status": status,
+                "date": date,
+                "history": []
+            }
+            if queries is not None:
+                repos[repo_name]["queries"] = json.loads(queries)
+            keys[repo_key] = repo_name
+        if keys:
+            for repo_key, status, date, last_date, count in self.__connection.execute(
+                    "SELECT repo_key, status, date, last_date, count FROM history WHERE repo_key IN ({}) "
+                    "ORDER BY repo_key, position".format(", ".join("?" * len(keys))), list(keys)):
+                entry = {"date": date, "status": status}
+                if count is not None:
+                    entry["last_date"] = last_date
+                    entry["count"] = count
+                repos[keys[repo_key]]["history"].append(entry)
+        return {
+            "owner__username": username,
+            "owner__name": name,
+            "owner__email": json.loads(emails) if emails else [],
+            "owner__html_url": html_url,
+            "repos": repos
+        }
+
+    def has_repo(self, username: str, repo_name: str) -> bool:
+        """
+        :return: true if the repo is stored, looked up through the unique index without reading the record
+        """
+        with self.__lock:
+            return self.__connection.execute(
+                "SELECT 1 FROM repos WHERE username = ? AND repo_name = ?", [username, repo_name]
+            ).fetchone() is not None
+
+    def owner_summaries(self, usernames: typing.Iterable) -> typing.Iterator:
+        """
+        :param usernames: owner__username of the owners to summarize, the others are not read
+        :return: iterator of (owner__username, owner__name, owner__email, owner__html_url, date of the latest repo)
+        """
+        usernames = list(dict.fromkeys(usernames))
+        rows = []
+        with self.__lock:
+            for start in range(0, len(usernames), QUERY_CHUNK_SIZE):
+                chunk = usernames[start:start + QUERY_CHUNK_SIZE]
+                rows.extend(self.__connection.execute(
+                    "SELECT owners.username, name, emails, html_url, MAX(repos.date) FROM owners "
+                    "LEFT JOIN repos ON repos.username = owners.username WHERE owners.username IN ({}) "
+                    "GROUP BY owners.username".format(", ".join("?" * len(chunk))), chunk
+                ))
+        for username, name, emails, html_url, last_date in rows:
+            yield username, name, json.loads(emails) if emails else [], html_url, last_date
+
+    def select(self, statuses: typing.Iterable) -> list:
+        """
+        :param statuses: repo statuses, case insensitive
+        :return: owner__username of the owners with a repo in any of the statuses
+        """
+        statuses = list(statuses)
+        with self.__lock:
+            return [row[0] for row in self.__connection.execute(
+                "SELECT DISTINCT username FROM repos WHERE status COLLATE NOCASE IN ({})"
+                .format(", ".join("?" * len(statuses))), statuses
+            )]
+
+    def save(self, records: typing.Union[dict, typing.Iterable]):
+        """
+        write records, replacing their stored rows
+        :param records: { owner__username: record } or iterable of records, repos either as a dict or a list
+        :return:
+        """
+        records = records.values() if isinstance(records, dict) else records
+        with self.__lock, self.__connection:
+            for record in records:
+                username = record["owner__username"]
+                repos = record["repos"].values() if isinstance(record["repos"], dict) else record["repos"]
+                self.__connection.execute(
+                    "INSERT OR REPLACE INTO owners VALUES (?, ?, ?, ?)",
+                    [username, record.get("owner__name"), json.dumps(record.get("owner__email") or []),
+                     record.get("owner__html_url")]
+                )
+                for repo in repos:
+                    queries = json.dumps(repo["queries"]) if repo.get("queries") is not None else None
+                    self.__connection.execute(
+                        "INSERT INTO repos (username, repo_name, repo_html_url, status, date, queries) "
+                        "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (username, repo_name) DO UPDATE SET "
+                        "repo_html_url = excluded.repo_html_url, status = excluded.status, date = excluded.date, "
+                        "queries = excluded.queries",
+                        [username, repo["repo__name"], repo.get("repo__html_url"), repo.get("status"),
+                         str(repo.get("date")), queries]
+                    )
+                    repo_key = self.__connection.execute(
+                        "SELECT repo_key FROM repos WHERE username = ? AND repo_name = ?",
+                        [username, repo["repo__name"]]
+                    ).fetchone()[0]
+                    self.__connection.execute("DELETE FROM history WHERE repo_key = ?", [repo_key])
+                    self.__connection.executemany(
+                        "INSERT INTO history VALUES (?, ?, ?, ?, ?, ?)",
+                        [(repo_key, position, entry.get("status"), str(entry.get("date")),
+                          str(entry["last_date"]) if "count" in entry else None, entry.get("count"))
+                         for position, entry in enumerate(repo.get("history") or [])]
+                    )
+                self.__records.pop(username, None)
+
+    def export(self) -> dict:
+        """
+        :return: every stored record in the output format of find and send
+        """
+        return {
+            "results": [
+                {**record, "repos": list(record["repos"].values())}
+                for record in (self[username] for username in self)
+            ]
+        }
@@ -0,0 +1,132 @@
+"""
+RepoIndex
+--------------------------------------------------
+Persistent index of the GitHub repo ids seen by find. Ids are kept exactly in a sorted array of 64 bit integers,
+fronted by a bloom filter, so most repos never seen before are rejected without searching the array. Repo ids stay
+the same when a repo is renamed or transferred, so the index recognizes such repos as well.
+"""
+
+from array import array
+from bisect import bisect_left
+import heapq
+import os
+import struct
+import sys
+import typing
+
+MAGIC = b"TDRI"
+# magic, version, number of ids, number of bits of the bloom filter, number of hashes
+HEADER = struct.Struct("<4sIQQI")
+VERSION = 1
+BITS_PER_ID = 10
+N_HASHES = 7
+MIN_BITS = 1 << 13
+MASK = (1 << 64) - 1
+
+
+class RepoIndex:
+
+    def __init__(self, path: str = None):
+        """
+        open the index, an index that does not exist yet starts empty
+        :param path: path of the index file, None for an index in memory only
+        """
+        self.path = path
+        self.__ids = array("q")
+        # ids added since the array was last rebuilt, merged into it by flush()
+        self.__pending = set()
+        self.__bits = 0
+        self.__bloom = bytearray()
+        if path and os.path.exists(path):
+            self.__load()
+        else:
+            self.__build_bloom()
+
+    def __load(self):
+        with open(self.path, "rb") as file:
+            magic, version, count, bits, n_hashes = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or n_hashes != N_HASHES:
+                print("Repo index {} has an unknown format, start an empty one.".format(self.path), file=sys.stderr)
+                self.__build_bloom()
+                return
+            self.__ids.frombytes(file.read(count * self.__ids.itemsize))
+            if sys.byteorder != "little":
+                self.__ids.byteswap()
+            self.__bits = bits
+            self.__bloom = bytearray(file.read(bits // 8))
+
+    def __build_bloom(self):
+        self.__bits = max(MIN_BITS, len(self.__ids) * BITS_PER_ID * 2)
+        self.__bits -= self.__bits % 8
+        self.__bloom = bytearray(self.__bits // 8)
+        for repo_id in self.__ids:
+            self.__set(repo_id)
+
+    def __positions(self, repo_id: int) -> typing.Iterator:
+        # double hashing of the id, two multiplicative hashes give all N_HASHES positions
+        first = (repo_id * 0x9E3779B97F4A7C15) & MASK
+        second = ((repo_id ^ (first >> 29)) * 0xBF58476D1CE4E5B9 & MASK) | 1
+        for index in range(N_HASHES):
+            yield (first + index * second) % self.__bits
+
+    def __set(self, repo_id: int):
+        for position in self.__positions(repo_id):
+            self.__bloom[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, repo_id) -> bool:
+        if repo_id is None:
+            return False
+        for position in self.__positions(repo_id):
+            if not self.__bloom[position >> 3] & 1 << (position & 7):
+                return False
+        if repo_id in self.__pending:
+            return True
+        index = bisect_left(self.__ids, repo_id)
+        return index < len(self.__ids) and self.__ids[index] == repo_id
+
+    def __len__(self) -> int:
+        return len(self.__ids) + len(self.__pending)
+
+    def add(self, repo_ids: typing.Iterable):
+        """
+        add repo ids, they are found right away and stored by save()
+        :param repo_ids: iterable of repo ids
+        :return:
+        """
+        for repo_id in repo_ids:
+            if repo_id is not None and repo_id not in self:
+                self.__pending.add(repo_id)
+                self.__set(repo_id)
+
+    def flush(self):
+        """
+        merge the ids added into the sorted array, the bloom filter is resized once it gets too full
+        :return:
+        """
+        if not self.__pending:
+            return
+        # pending ids are never in the array, a linear merge keeps it sorted and unique
+        self.__ids = array("q", heapq.merge(self.__ids, sorted(self.__pending)))
+        self.__pending = set()
+        if len(self.__ids) * BITS_PER_ID > self.__bits:
+            self.__build_bloom()
+
+    def save(self):
+        """
+        write the index, the file is replaced atomically
+        :return:
+        """
+        self.flush()
+        if not self.path:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(self.__ids), self.__bits, N_HASHES))
+            if sys.byteorder != "little":
+                ids = array("q", self.__ids)
+                ids.byteswap()
+                file.write(ids.tobytes())
+            else:
+                file.write(self.__ids.tobytes())
+            file.write(self.__bloom)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,5 @@
+"""
+storage submodule v0.0.1
+
+This submodule provides persistent stores shared by runs of the take down tasks.
+"""
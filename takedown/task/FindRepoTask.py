@@ -7,62 +7,210 @@ Run tool to find repos that should be taken down
 """
 
 from .BaseTask import BaseTask
-from takedown.client.GitHub import GitHubClient
+from .Pipeline import Pipeline
+from .OwnerEnricher import OwnerEnricher, DEFAULT_ENRICH_THREADS
+from takedown.storage.OwnerCache import OwnerCache, DEFAULT_TTL
+from takedown.storage.Checkpoint import Checkpoint
+from takedown.storage.RecordStore import RecordStore
+from takedown.storage.RepoIndex import RepoIndex
+from takedown.storage.HistoryArchive import HistoryArchive, append_history
+from takedown.client.GitHub import GitHubClient, DEFAULT_N_THREADS, PER_PAGE, MAX_PAGES
+from takedown.client.QuerySharder import QuerySharder, MAX_RESULTS
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import json
+import os
 import sys
-import requests
+import typing
 import datetime
 
 
+# configs of FindRepoTask that are passed to its GitHubClient
+CLIENT_CONFIG_KEYS = ["pool_size", "cache_path", "cache_size", "max_attempts", "retry_deadline"]
+# fields of search results used by the task, nothing else is extracted from GitHub responses
+SEARCH_FIELDS = ["owner__url", "owner__id", "owner__login", "owner__type", "owner__html_url", "repo__id",
+                 "repo__name", "repo__html_url", "repo__updated_at"]
+# sort of incremental searches, newest results first
+INCREMENTAL_SORT = {
+    "code": "indexed",
+    "repo": "updated"
+}
+
+
 class FindRepoTask(BaseTask):
 
     def __init__(self, **config):
         super().__init__(**config)
         self.__dict__.update(config)
-        self.client = GitHubClient()
+        self.client = GitHubClient(**{key: config[key] for key in CLIENT_CONFIG_KEYS if key in config})
+        # number of search pages fetched concurrently
+        self.n_threads = config.get("n_threads", DEFAULT_N_THREADS)
         self.__token = ""
         self.__is_authenticated = False
         self.search_query = ""
+        # all queries of a batch run, search_query is the first one
+        self.search_queries = []
         self.previous_records = None
+        # (owner__username, repo__name) of previous records
+        self.__seen_repos = set()
+        # persistent repo__id of every repo found by previous runs, replaces the names of previous records
+        self.seen_index = RepoIndex(config["seen_index"]) if config.get("seen_index") else None
+        # incremental mode: path of the high-water marks, { "target:query": newest repo__updated_at }
+        self.incremental = config.get("incremental")
+        self.watermarks = {}
+        if self.incremental and os.path.exists(self.incremental):
+            with open(self.incremental) as file:
+                self.watermarks = json.load(file)
+        # progress of the run is saved to the checkpoint after every page, resume continues from it
+        self.checkpoint = Checkpoint(config["checkpoint"]) if config.get("checkpoint") else None
+        self.resume = config.get("resume", False)
+        # "target:query": { "pages": number of pages grouped, "done": true if the search finished }
+        self.__progress = {}
+        # "target:query": [[shard query, page]] of the shard pages grouped, sharded searches are not paged in order
+        self.__shard_pages = {}
+        # repo__id: [owner__username, repo__name] of the repos grouped in the run
+        self.__grouped_repos = {}
+        # searches of several targets run concurrently, they share the grouped results and prompt one at a time
+        self.__group_lock = threading.Lock()
+        self.__prompt_lock = threading.Lock()
+        self.__confirmed_queries = set()
+        # history of the repos found is compacted, and moved to the archive once out of the retention window
+        self.history_archive = HistoryArchive(config.get("history_archive"), config.get("history_retention"))
         # save rate limit and bandwidth with GitHub requests, cache user_info
         self.cached_user_info = {}
+        # persistent profiles shared by runs
+        self.owner_cache = None
+        if config.get("owner_cache"):
+            self.owner_cache = OwnerCache(config["owner_cache"], ttl=config.get("owner_cache_ttl", DEFAULT_TTL))
+        # resolves owners concurrently, shares cached_user_info
+        self.enricher = OwnerEnricher(self.client, config.get("enrich_threads", DEFAULT_ENRICH_THREADS),
+                                      self.cached_user_info, self.owner_cache, self.previous_profiles)
 
-    def prepare(self, token: str, search_query: str, previous_records: dict = None):
+    def prepare(self, token: typing.Union[str, list], search_query: typing.Union[str, list],
+                previous_records: dict = None):
         """
         prepare the task
-        :param token: input github token
-        :param search_query: input search_query
+        :param token: input github token, or a list of tokens whose rate limits are pooled
+        :param search_query: input search_query, or a list of queries searched in one run
         :param previous_records: previous records of searched repos
         :return: self instance
         """
         self.client.authenticate(token)
         self.__token = token
         self.__is_authenticated = True
-        self.search_query = search_query
-        self.previous_records = previous_records
+        self.search_queries = [search_query] if isinstance(search_query, str) else list(dict.fromkeys(search_query))
+        self.search_query = self.search_queries[0] if self.search_queries else ""
+        self.set_previous_records(previous_records)
         return self
 
-    def __pre_check__(self, ignore_warning: bool = False):
+    def set_previous_records(self, previous_records: dict = None):
+        """
+        set the records the next searches are compared against, e.g. between the sweeps of a monitor
+        :param previous_records: previous records of searched repos, or a RecordStore read lazily
+        :return:
+        """
+        self.previous_records = previous_records
+        self.__seen_repos = set()
+        # a record store is asked per repo and per owner as results come in, it is never read as a whole
+        if previous_records and not isinstance(previous_records, RecordStore):
+            self.__seen_repos = {
+                (username, repo_name) for username, record in previous_records.items() for repo_name in record["repos"]
+            }
+
+    def previous_profiles(self, logins: list) -> dict:
+        """
+        profiles of owners in previous records, looked up by the enricher before requesting them from GitHub. A
+        profile is stale if the owner was last detected more than `record_ttl` seconds ago, stale owners are requested
+        again.
+        :param logins: owner__login of the owners to resolve
+        :return: { owner__login: profile } of the owners with a profile in previous records that is not stale
+        """
+        previous_records = self.previous_records
+        if isinstance(previous_records, RecordStore):
+            summaries = previous_records.owner_summaries(logins)
+        elif previous_records:
+            # records of the run are grouped into previous records while owners are resolved
+            with self.__group_lock:
+                summaries = [
+                    (login, record.get("owner__name"), record.get("owner__email"), record.get("owner__html_url"),
+                     max((str(repo["date"]) for repo in record["repos"].values()), default=None))
+                    for login, record in ((login, previous_records.get(login)) for login in logins) if record
+                ]
+        else:
+            return {}
+        record_ttl = getattr(self, "record_ttl", None)
+        now = datetime.datetime.now()
+        profiles = {}
+        for username, name, emails, html_url, last_date in summaries:
+            if record_ttl is not None:
+                try:
+                    last_detected = datetime.datetime.fromisoformat(last_date)
+                except (TypeError, ValueError):
+                    continue
+                if (now - last_detected).total_seconds() > record_ttl:
+                    continue
+            emails = [emails] if isinstance(emails, str) else [email for email in emails or [] if email]
+            profiles[username] = {
+                "login": username,
+                "name": name,
+                "email": emails[0] if emails else None,
+                "html_url": html_url
+            }
+        return profiles
+
+    def __pre_check__(self, ignore_warning: bool = False, search_query: str = None):
         """
         run before execute
         :return: false if check failed
         """
-        if self.search_query == "":
+        search_query = search_query if search_query is not None else self.search_query
+        if search_query == "":
             return False
-        if len(self.search_query) < 5 and not ignore_warning:
-            confirm = None
-            while not confirm:
-                confirm = input("The length of search query `{}` is too short that will produce massive search results."
-                                " Are you sure to proceed? [y/n]\n".format(self.search_query))
-                if confirm.lower() not in ['y', 'n']:
-                    confirm = None
-                    print("Please enter 'y' or 'n': ")
-                elif confirm.lower() == 'n':
-                    return False
+        if len(search_query) < 5 and not ignore_warning:
+            with self.__prompt_lock:
+                # a query is confirmed once for all targets
+                confirm = "y" if search_query in self.__confirmed_queries else None
+                while not confirm:
+                    confirm = input("The length of search query `{}` is too short that will produce massive search "
+                                    "results. Are you sure to proceed? [y/n]\n".format(search_query))
+                    if confirm.lower() not in ['y', 'n']:
+                        confirm = None
+                        print("Please enter 'y' or 'n': ")
+                    elif confirm.lower() == 'n':
+                        return False
+                self.__confirmed_queries.add(search_query)
         if not self.__is_authenticated:
             print("No token provided for GitHub client.", file=sys.stderr)
             return False
         return True
 
+    def print_rate_limit(self):
+        """
+        report the remaining GitHub budget of the client
+        :return:
+        """
+        for resource in ["search", "core"]:
+            budget = self.client.rate_limit(resource)
+            print("Remaining {} requests: {}/{}, reset at {}.".format(
+                resource, budget["remaining"], budget["limit"],
+                datetime.datetime.fromtimestamp(budget["reset"]).strftime("%H:%M:%S")
+            ))
+        cache_stats = self.client.cache_stats()
+        if cache_stats:
+            print("Response cache: {} hits, {} misses.".format(cache_stats["hits"], cache_stats["misses"]))
+
+    def enrich_owners(self, results: list) -> dict:
+        """
+        fetch the profile of every owner of results. Profiles are resolved in batches through the GraphQL API, owners
+        it cannot resolve fall back to one REST request each.
+        :param results: search results with fields `owner__url`, `owner__login`, `owner__type` and `owner__id`
+        :return: { owner__url: profile }
+        """
+        return self.enricher.enrich({
+            result["owner__url"]: (result["owner__login"], result["owner__type"], result.get("owner__id"))
+            for result in results
+        })
+
     def execute_search_by_code(self, ignore_warning: bool = False, chain: bool = False):
         """
         search by code
@@ -70,291 +218,269 @@ class FindRepoTask(BaseTask):
         :param ignore_warning:
         :return:
         """
+        return self.execute("code", ignore_warning=ignore_warning, chain=chain)
+
+    def execute_search_by_repo(self, ignore_warning: bool = False, chain: bool = False):
+        """
+        search by repo
+        :param ignore_warning:
+        :param chain: true if used in multiple targets
+        :return:
+        """
+        return self.execute("repo", ignore_warning=ignore_warning, chain=chain)
+
+    def execute_search(self, search_option: str, ignore_warning: bool = False, chain: bool = False,
+                       final_result_dict: dict = None, repo_index: dict = None, search_query: str = None):
+        """
+        search and group the results by owner. Pages are fetched, deduped, enriched with owner info and grouped in a
+        pipeline, so owners of one page are resolved while the next pages are still being downloaded.
+        :param search_option: "code" | "repo"
+        :param ignore_warning:
+        :param chain: true if used in multiple targets
+        :param final_result_dict: { owner__username: record }, grouped results shared by the searches of a run
+        :param repo_index: { repo__id: queries that matched the repo }, repos already grouped in the run
+        :param search_query: query to search, search_query of the task by default
+        :return:
+        """
+        search_query = search_query if search_query is not None else self.search_query
         # pre-check
-        if not self.__pre_check__(ignore_warning):
+        if not self.__pre_check__(ignore_warning, search_query):
             return None
 
+        final_result_dict = final_result_dict if final_result_dict is not None else {}
+        # cache repo ids to ensure each result is unique after processing, across all searches of the run
+        repo_index = repo_index if repo_index is not None else {}
+        search_key = "{}:{}".format(search_option, search_query)
+        with self.__group_lock:
+            progress = self.__progress.setdefault(search_key, {"pages": 0, "done": False})
+        if progress["done"]:
+            print("Search for {} `{}` was finished before the checkpoint, skipped.".format(search_option, search_query))
+            return final_result_dict if chain else self.format_results(final_result_dict)
+
         # try to fire one request
-        print("Start searching for code...")
-        first_result = self.client.search(self.search_query, "code", )
+        print("Start searching for {} `{}`...".format(search_option, search_query))
+        first_result = self.client.search(search_query, search_option, fields=SEARCH_FIELDS,
+                                          **self.sort_options(search_option))
         if not first_result:
             print("An error occurs, abort program", file=sys.stderr)
+            self.print_rate_limit()
             return None
         else:
             print("Results retrieved from GitHub. Page: 1.")
-        if first_result.total > 500 and not ignore_warning:
-            confirm = None
-            while not confirm:
-                confirm = input("The number of search results is {}. It is so large that you may narrow search queries."
-                                " The max retrievable number is 1000. Are you sure to proceed? [y/n]\n"
-                                .format(first_result.total))
-                if confirm.lower() not in ['y', 'n']:
-                    confirm = None
-                    print("Please enter 'y' or 'n': ")
-                elif confirm.lower() == 'n':
+        # incremental searches stop at the results seen before, large totals cost no more requests
+        if first_result.total > 500 and not ignore_warning and not self.incremental:
+            with self.__prompt_lock:
+                if not self.confirm_total(first_result.total):
                     return None
 
-        fields_filtered_results = []
-        code_search_result = first_result
-        total = first_result.total
-        page = 2  # page 1 has been requested
-        while total > (page - 1) * 100 and page <= 10:
-            fields_filtered_results = [*code_search_result.generate_list([
-                "owner__url", "repo__name", "repo__html_url",
-            ]), *fields_filtered_results]
-            code_search_result = self.client.search(self.search_query, "code", page=page)
-            if not code_search_result:
-                print("Error in search with GitHub rest APIs", file=sys.stderr)
-                return None
-            else:
-                print("Results retrieved from GitHub. Page: {}.".format(page))
-            page += 1
-        fields_filtered_results = [*code_search_result.generate_list([
-            "owner__url", "owner__html_url", "repo__name", "repo__html_url",
-        ]), *fields_filtered_results]
-
-        print("Retrieving additional information of users...")
-        processed_results = []
-        # cache repeated user info to save request rate
-        cached_user_info = self.cached_user_info
-        # cache repo html url to ensure each result is unique after processing
-        repo_set = set()
-        # process result by adding user info
-        for result in fields_filtered_results:
-            if result["repo__html_url"] not in repo_set:
-                res = cached_user_info.get(result["owner__url"], None)
-                if not res:
-                    res = requests.get(result["owner__url"], headers={
-                        'user-agent': 'python',
-                        'Authorization': "token {}".format(self.__token)
-                    }).json()
-                    cached_user_info[result["owner__url"]] = res
-                processed_results.append({
-                    **result,
-                    "owner__email": res.get("email", None),
-                    "owner__name": res.get("name", None),
-                    "owner__username": res.get("login", None),
-                    "owner__html_url": res.get("html_url", None)
-                })
-                repo_set.add(result["repo__html_url"])
-
-        print("Processing results...")
-        final_result_dict = {}
-        for result in processed_results:
-            if result["owner__username"] in final_result_dict:
-                repos = final_result_dict[result["owner__username"]]["repos"]
-                # if repo already exist
-                if result["repo__name"] in repos:
-                    # update history
-                    repos[result["repo__name"]]["history"].append(
-                        {
-                            "date": repos[result["repo__name"]]["date"],
-                            "status": repos[result["repo__name"]]["status"]
-                        }
-                    )
-                    repos[result["repo__name"]]["status"] = "Redetected"
-                    repos[result["repo__name"]]["date"] = str(datetime.datetime.now())
-                else:
-                    repos[result["repo__name"]] = {
-                        "repo__name": result["repo__name"],
-                        "repo__html_url": result["repo__html_url"],
-                        "status": "New",
-                        "date": str(datetime.datetime.now()),
-                        "history": []
-                    }
-            elif self.previous_records and result["owner__username"] in self.previous_records:
-                previous_record = self.previous_records[result["owner__username"]]
-                repos = previous_record["repos"]
-                # if repo already exist
-                if result["repo__name"] in repos:
-                    repos[result["repo__name"]]["history"].append(
-                        {
-                            "date": repos[result["repo__name"]]["date"],
-                            "status": repos[result["repo__name"]]["status"]
-                        }
-                    )
-                    repos[result["repo__name"]]["status"] = "Redetected"
-                    repos[result["repo__name"]]["date"] = str(datetime.datetime.now())
+        def dedupe(numbered_page: tuple) -> tuple:
+            # code results may hit several files of one repo, and other targets or queries may find the same repo
+            page_number, page = numbered_page
+            unique_results = []
+            # repos grouped before whose queries this page tags, their records change too
+            tagged_repos = []
+            with self.__group_lock:
+                for result in page:
+                    if result["repo__id"] in repo_index:
+                        if search_query not in repo_index[result["repo__id"]]:
+                            repo_index[result["repo__id"]].append(search_query)
+                            tagged_repos.append(result["repo__id"])
+                    else:
+                        repo_index[result["repo__id"]] = [search_query]
+                        unique_results.append(result)
+            return page_number, unique_results, tagged_repos
+
+        def enrich(numbered_page: tuple) -> tuple:
+            return numbered_page + (self.enrich_owners(numbered_page[1]),)
+
+        # newest repo__updated_at of the search
+        watermark = [self.watermarks.get(search_key)]
+
+        def group(enriched_page: tuple):
+            page_number, page, tagged_repos, profiles = enriched_page
+            with self.__group_lock:
+                for result in page:
+                    if result.get("repo__updated_at") and (watermark[0] is None or
+                                                           result["repo__updated_at"] > watermark[0]):
+                        watermark[0] = result["repo__updated_at"]
+                    res = profiles[result["owner__url"]]
+                    # owners whose profile cannot be resolved, e.g. deleted since they were indexed, are grouped
+                    # by the login and page of the search result
+                    username = res.get("login") or result["owner__login"]
+                    self.group_result({
+                        **result,
+                        "owner__email": res.get("email", None),
+                        "owner__name": res.get("name", None),
+                        "owner__username": username,
+                        "owner__html_url": res.get("html_url") or result["owner__html_url"]
+                    }, final_result_dict)
+                    # tag the repo with the queries that matched it, later searches of the run may add more
+                    final_result_dict[username]["repos"][result["repo__name"]]["queries"] = \
+                        repo_index[result["repo__id"]]
+                    self.__grouped_repos[result["repo__id"]] = [username, result["repo__name"]]
+                if isinstance(page_number, int):
+                    progress["pages"] = page_number
                 else:
-                    repos[result["repo__name"]] = {
-                        "repo__name": result["repo__name"],
-                        "repo__html_url": result["repo__html_url"],
-                        "status": "New",
-                        "date": str(datetime.datetime.now()),
-                        "history": []
-                    }
-                final_result_dict[result["owner__username"]] = previous_record
-            else:
-                final_result_dict[result["owner__username"]] = {
-                    "owner__username": result["owner__username"],
-                    "owner__name": result["owner__name"],
-                    "owner__email": [result["owner__email"]],
-                    "owner__html_url": result["owner__html_url"],
-                    "repos": {
-                        result["repo__name"]: {
-                            "repo__name": result["repo__name"],
-                            "repo__html_url": result["repo__html_url"],
-                            "status": "New",
-                            "date": str(datetime.datetime.now()),
-                            "history": []
-                        }
-                    }
-                }
+                    self.__shard_pages.setdefault(search_key, []).append(list(page_number))
+                self.append_checkpoint(search_key, final_result_dict, [result["repo__id"] for result in page],
+                                       tagged_repos, profiles, page_number)
+
+        print("Retrieving results and additional information of users...")
+        with self.__group_lock:
+            shard_pages = list(self.__shard_pages.get(search_key, []))
+        succeeded = Pipeline().add_stage(dedupe).add_stage(enrich).run(
+            self.iter_result_pages(search_option, first_result, search_query, progress["pages"], shard_pages), group
+        )
+        self.print_rate_limit()
+        if not succeeded:
+            print("Error in search with GitHub rest APIs", file=sys.stderr)
+            return None
+        with self.__group_lock:
+            if self.incremental and watermark[0]:
+                self.watermarks[search_key] = watermark[0]
+                self.save_watermarks()
+            progress["done"] = True
+            self.append_checkpoint(search_key, final_result_dict)
         if chain:
             return final_result_dict
+        return self.format_results(final_result_dict)
 
-        final_result = {
-            "results": []
-        }
-        for user in final_result_dict.values():
-            repos = user.pop("repos")
-            final_result["results"].append(
-                {
-                    **user,
-                    "repos": [
-                        {**repo_info} for repo_info in repos.values()
-                    ]
-                }
-            )
+    def sort_options(self, search_option: str) -> dict:
+        """
+        :param search_option: "code" | "repo"
+        :return: sort options of the search, newest results first in incremental mode
+        """
+        if self.incremental:
+            return {"sort": INCREMENTAL_SORT[search_option]}
+        return {}
 
-        return final_result
+    def save_watermarks(self):
+        """
+        write the high-water marks of incremental searches
+        :return:
+        """
+        with open(self.incremental, "w+") as file:
+            json.dump(self.watermarks, file, indent=2)
 
-    def execute_search_by_repo(self, ignore_warning: bool = False, chain: bool = False):
+    def save_checkpoint(self, final_result_dict: dict):
         """
-        search by code
-        :param ignore_warning:
+        save the whole progress of the run, replacing the checkpoint
+        :param final_result_dict: { owner__username: record }, grouped results of the run
         :return:
         """
-        # pre-check
-        if not self.__pre_check__(ignore_warning):
-            return None
+        if not self.checkpoint:
+            return
+        self.checkpoint.save({
+            "searches": self.__progress,
+            "shard_pages": self.__shard_pages,
+            "results": final_result_dict,
+            "repos": self.__grouped_repos,
+            # copied as the enricher keeps adding profiles
+            "profiles": dict(self.cached_user_info)
+        })
 
-        # try to fire one request
-        print("Start searching for repo...")
-        first_result = self.client.search(self.search_query, "repo", )
-        if not first_result:
-            print("An error occurs, abort program", file=sys.stderr)
-            return None
-        else:
-            print("Results retrieved from GitHub. Page: 1.")
-        if first_result.total > 500 and not ignore_warning:
-            confirm = None
-            while not confirm:
-                confirm = input("The number of search results is {}. It is so large that you may narrow search queries."
-                                " The max retrievable number is 1000. Are you sure to proceed? [y/n]\n"
-                                .format(first_result.total))
-                if confirm.lower() not in ['y', 'n']:
-                    confirm = None
-                    print("Please enter 'y' or 'n': ")
-                elif confirm.lower() == 'n':
-                    return None
+    def append_checkpoint(self, search_key: str, final_result_dict: dict, repo_ids: list = (),
+                          tagged_repos: list = (), profiles: dict = None, page_number=None):
+        """
+        save the progress of a page, only the records it changed are written. The caller holds the group lock.
+        :param search_key: "target:query" of the search
+        :param final_result_dict: { owner__username: record }, grouped results of the run
+        :param repo_ids: repo__id of the repos grouped from the page
+        :param tagged_repos: repo__id of the repos grouped before whose queries the page tagged
+        :param profiles: { owner__url: profile } of the owners of the page
+        :param page_number: page grouped, (shard query, page) for the page of a shard
+        :return:
+        """
+        if not self.checkpoint:
+            return
+        repos = {repo_id: self.__grouped_repos[repo_id] for repo_id in repo_ids}
+        usernames = {username for username, _ in repos.values()}
+        usernames.update(self.__grouped_repos[repo_id][0] for repo_id in tagged_repos
+                         if repo_id in self.__grouped_repos)
+        self.checkpoint.append({
+            "searches": {search_key: self.__progress[search_key]},
+            "shard_pages": {search_key: [list(page_number)]} if isinstance(page_number, tuple) else {},
+            "results": {username: final_result_dict[username] for username in usernames},
+            "repos": repos,
+            "profiles": {url: profile for url, profile in (profiles or {}).items() if profile}
+        })
 
-        fields_filtered_results = []
-        code_search_result = first_result
-        total = first_result.total
-        page = 2  # page 1 has been requested
-        while total > (page - 1) * 100 and page <= 10:
-            fields_filtered_results = [*code_search_result.generate_list([
-                "owner__url", "repo__name", "repo__html_url",
-            ]), *fields_filtered_results]
-            code_search_result = self.client.search(self.search_query, "repo", page=page)
-            if not code_search_result:
-                print("Error in search with GitHub rest APIs", file=sys.stderr)
-                return None
-            else:
-                print("Results retrieved from GitHub. Page: {}.".format(page))
-            page += 1
-        fields_filtered_results = [*code_search_result.generate_list([
-            "owner__url", "owner__html_url", "repo__name", "repo__html_url",
-        ]), *fields_filtered_results]
-
-        print("Retrieving additional information of users...")
-        processed_results = []
-        # cache repeated user info to save request rate
-        # repo results are unique returned by GitHub
-        cached_user_info = self.cached_user_info
-        # cache repo html url to ensure each result is unique after processing
-        for result in fields_filtered_results:
-            res = cached_user_info.get(result["owner__url"], None)
-            if not res:
-                res = requests.get(result["owner__url"], headers={
-                    'user-agent': 'python',
-                    'Authorization': "token {}".format(self.__token)
-                }).json()
-                cached_user_info[result["owner__url"]] = res
-            processed_results.append({
-                **result,
-                "owner__email": res.get("email", None),
-                "owner__name": res.get("name", None),
-                "owner__username": res.get("login", None),
-                "owner__html_url": res.get("html_url", None)
-            })
-
-        print("Processing results...")
-        final_result_dict = {}
-        for result in processed_results:
-            if result["owner__username"] in final_result_dict:
-                repos = final_result_dict[result["owner__username"]]["repos"]
-                # if repo already exist
-                if result["repo__name"] in repos:
-                    repos[result["repo__name"]]["history"].append(
-                        {
-                            "date": repos[result["repo__name"]]["date"],
-                            "status": repos[result["repo__name"]]["status"]
-                        }
-                    )
-                    repos[result["repo__name"]]["status"] = "Redetected"
-                    repos[result["repo__name"]]["date"] = str(datetime.datetime.now())
-                else:
-                    repos[result["repo__name"]] = {
-                        "repo__name": result["repo__name"],
-                        "repo__html_url": result["repo__html_url"],
-                        "status": "New",
-                        "date": str(datetime.datetime.now()),
-                        "history": []
-                    }
-            elif self.previous_records and result["owner__username"] in self.previous_records:
-                previous_record = self.previous_records[result["owner__username"]]
-                repos = previous_record["repos"]
-                # if repo already exist
-                if result["repo__name"] in repos:
-                    repos[result["repo__name"]]["history"].append(
-                        {
-                            "date": repos[result["repo__name"]]["date"],
-                            "status": repos[result["repo__name"]]["status"]
-                        }
-                    )
-                    repos[result["repo__name"]]["status"] = "Redetected"
-                    repos[result["repo__name"]]["date"] = str(datetime.datetime.now())
-                else:
-                    repos[result["repo__name"]] = {
-                        "repo__name": result["repo__name"],
-                        "repo__html_url": result["repo__html_url"],
-                        "status": "New",
-                        "date": str(datetime.datetime.now()),
-                        "history": []
-                    }
-                final_result_dict[result["owner__username"]] = previous_record
-            else:
-                final_result_dict[result["owner__username"]] = {
-                    "owner__username": result["owner__username"],
-                    "owner__name": result["owner__name"],
-                    "owner__email": [result["owner__email"]],
-                    "owner__html_url": result["owner__html_url"],
-                    "repos": {
-                        result["repo__name"]: {
-                            "repo__name": result["repo__name"],
-                            "repo__html_url": result["repo__html_url"],
-                            "status": "New",
-                            "date": str(datetime.datetime.now()),
-                            "history": []
-                        }
-                    }
-                }
+    def load_checkpoint(self, final_result_dict: dict, repo_index: dict):
+        """
+        restore the progress of a previous run from the checkpoint
+        :param final_result_dict: { owner__username: record }, filled with the grouped results of the checkpoint
+        :param repo_index: { repo__id: queries that matched the repo }, filled with the repos of the checkpoint
+        :return:
+        """
+        state = self.checkpoint.load()
+        if not state:
+            print("No checkpoint to resume from, start a new run.")
+            return
+        final_result_dict.update(state["results"])
+        for repo_id, (username, repo_name) in state["repos"].items():
+            # the queries of the record and the index are one list, later searches tag both
+            repo_index[int(repo_id)] = final_result_dict[username]["repos"][repo_name].setdefault("queries", [])
+            self.__grouped_repos[int(repo_id)] = [username, repo_name]
+        self.cached_user_info.update(state["profiles"])
+        self.__progress = state["searches"]
+        self.__shard_pages = state["shard_pages"]
+        print("Resumed from checkpoint: {}/{} searches finished, {} owners, {} repos.".format(
+            len([progress for progress in self.__progress.values() if progress["done"]]), len(self.__progress),
+            len(final_result_dict), len(repo_index)
+        ))
 
-        if chain:
-            return final_result_dict
+    def is_seen(self, result: dict, watermark: str = None) -> bool:
+        """
+        :param result: search result
+        :param watermark: newest repo__updated_at of the previous run of the search
+        :return: true if the repo is in previous records or was not updated since the previous run
+        """
+        if watermark and result.get("repo__updated_at") and result["repo__updated_at"] <= watermark:
+            return True
+        if self.seen_index is not None and result.get("repo__id") in self.seen_index:
+            return True
+        if isinstance(self.previous_records, RecordStore):
+            # the index replaces the names of stored repos
+            store = self.previous_records
+            return self.seen_index is None and store.has_repo(result["owner__login"], result["repo__name"])
+        return (result["owner__login"], result["repo__name"]) in self.__seen_repos
+
+    def new_status(self, result: dict) -> str:
+        """
+        :param result: search result of a repo missing from the records
+        :return: "Redetected" if a previous run found the repo under another owner or name, otherwise "New"
+        """
+        if self.seen_index is not None and result.get("repo__id") in self.seen_index:
+            return "Redetected"
+        return "New"
+
+    @staticmethod
+    def confirm_total(total: int) -> bool:
+        """
+        ask the user whether to proceed with a large search
+        :param total: number of search results
+        :return: false if the user declined
+        """
+        confirm = None
+        while not confirm:
+            confirm = input("The number of search results is {}. It is so large that you may narrow search queries."
+                            " Queries of more than {} results are split into shards, which costs more requests."
+                            " Are you sure to proceed? [y/n]\n"
+                            .format(total, MAX_RESULTS))
+            if confirm.lower() not in ['y', 'n']:
+                confirm = None
+                print("Please enter 'y' or 'n': ")
+            elif confirm.lower() == 'n':
+                return False
+        return True
 
+    @staticmethod
+    def format_results(final_result_dict: dict) -> dict:
+        """
+        turn grouped results into the output format, repos of each owner as a list
+        :param final_result_dict: { owner__username: record }
+        :return:
+        """
         final_result = {
             "results": []
         }
@@ -371,44 +497,144 @@ class FindRepoTask(BaseTask):
 
         return final_result
 
-    def merge(self, results: list) -> dict:
+    def iter_result_pages(self, search_option: str, first_result, search_query: str = None, skip_pages: int = 0,
+                          skip_shard_pages: list = ()):
         """
-        merge intermediate results
-        :param results:
+        generator of the pages of the search, each page is (page number, list of dicts of SEARCH_FIELDS). Pages of a
+        sharded search are numbered (shard query, page).
+        :param search_option: "code" | "repo"
+        :param first_result: page 1 of the search, it tells the total count
+        :param search_query: query of first_result, search_query of the task by default
+        :param skip_pages: number of leading pages already grouped, they are neither fetched nor yielded
+        :param skip_shard_pages: (shard query, page) of the shard pages already grouped, they are not yielded
         :return:
         """
-        # merged results
-        processed_results = []
-        # map that used to <owner_username : index_in_processed_array>
-        cache_user = {}
-        # set that used to store visited repos
-        cache_set = set()
-        for result in results:
-            for record in result.keys():
-                curr = result[record]
-                if record in cache_user:
-                    processed_result = processed_results[cache_user[record]]
-                    for repo_name in curr["repos"].keys():
-                        if "{}/{}".format(record, repo_name) not in cache_set:
-                            processed_result["repos"].append(
-                                curr["repos"][repo_name]
-                            )
-                            cache_set.add("{}/{}".format(record, repo_name))
-                else:
-                    cache_user[record] = len(processed_results)
-                    repos = curr.get("repos")
-                    processed_results.append(
-                        {
-                            **curr,
-                            "repos": [
-                                {**repo_info} for repo_info in repos.values()
-                            ]
-                        }
-                    )
-                    for repo in repos.keys():
-                        cache_set.add("{}/{}".format(record, repo))
-
-        return {"results": processed_results}
+        search_query = search_query if search_query is not None else self.search_query
+        if self.incremental:
+            yield from self.iter_new_pages(search_option, first_result, search_query, skip_pages)
+            return
+        if skip_pages:
+            print("Resuming search for {} `{}` after page {}.".format(search_option, search_query, skip_pages))
+        if first_result.total > MAX_RESULTS:
+            # pages of shards go down the pipeline as they arrive, keyed by (shard query, page) in the checkpoint
+            print("Splitting the query into shards of at most {} results...".format(MAX_RESULTS))
+            if skip_shard_pages:
+                print("Resuming search for {} `{}` after {} shard pages.".format(search_option, search_query,
+                                                                                len(skip_shard_pages)))
+            for shard_query, page, page_result in QuerySharder(self.client, self.n_threads).iter_pages(
+                    search_query, search_option, fields=SEARCH_FIELDS, skip=skip_shard_pages,
+                    total=first_result.total):
+                print("Results retrieved from GitHub. Shard `{}`, page: {}.".format(shard_query, page))
+                yield (shard_query, page), page_result.generate_list(SEARCH_FIELDS)
+            return
+
+        if not skip_pages:
+            yield 1, first_result.generate_list(SEARCH_FIELDS)
+        # page 1 has been requested, the next pages follow the links GitHub returns, one page is fetched ahead
+        page = max(2, skip_pages + 1)
+        if page > min(MAX_PAGES, -(-first_result.total // PER_PAGE)):
+            return
+        for page, page_result in self.client.iter_search_pages(search_query, search_option, fields=SEARCH_FIELDS,
+                                                               page=page):
+            print("Results retrieved from GitHub. Page: {}.".format(page))
+            yield page, page_result.generate_list(SEARCH_FIELDS)
+
+    def iter_new_pages(self, search_option: str, first_result, search_query: str, skip_pages: int = 0):
+        """
+        generator of the pages of an incremental search. Results come newest first, so pages are fetched one by one
+        until a page has no result that was not seen before.
+        :param search_option: "code" | "repo"
+        :param first_result: page 1 of the search, sorted by sort_options()
+        :param search_query: query of first_result
+        :param skip_pages: number of leading pages already grouped, none of them stopped the search
+        :return:
+        """
+        watermark = self.watermarks.get("{}:{}".format(search_option, search_query))
+        last_page = min(MAX_PAGES, -(-first_result.total // PER_PAGE))
+
+        def is_last(page: int, results: list) -> bool:
+            if page >= last_page or all(self.is_seen(result, watermark) for result in results):
+                print("Incremental search of {} `{}` stopped at page {}/{}.".format(search_option, search_query, page,
+                                                                                   last_page))
+                return True
+            return False
+
+        if not skip_pages:
+            results = first_result.generate_list(SEARCH_FIELDS)
+            yield 1, results
+            if is_last(1, results):
+                return
+        page = max(2, skip_pages + 1)
+        if page > last_page:
+            return
+        # without prefetch, no page is requested past the one that stops the search
+        for page, page_result in self.client.iter_search_pages(search_query, search_option, fields=SEARCH_FIELDS,
+                                                               page=page, prefetch=False,
+                                                               **self.sort_options(search_option)):
+            print("Results retrieved from GitHub. Page: {}.".format(page))
+            results = page_result.generate_list(SEARCH_FIELDS)
+            yield page, results
+            if is_last(page, results):
+                return
+
+    def group_result(self, result: dict, final_result_dict: dict):
+        """
+        add one enriched result to the records grouped by owner, repos already known are tagged as redetected
+        :param result: search result with owner info
+        :param final_result_dict: { owner__username: record }
+        :return:
+        """
+        if result["owner__username"] in final_result_dict:
+            repos = final_result_dict[result["owner__username"]]["repos"]
+            # if repo already exist
+            if result["repo__name"] in repos:
+                # update history
+                append_history(repos[result["repo__name"]].setdefault("history", []),
+                               repos[result["repo__name"]]["status"], repos[result["repo__name"]]["date"])
+                repos[result["repo__name"]]["status"] = "Redetected"
+                repos[result["repo__name"]]["date"] = str(datetime.datetime.now())
+            else:
+                repos[result["repo__name"]] = {
+                    "repo__name": result["repo__name"],
+                    "repo__html_url": result["repo__html_url"],
+                    "status": self.new_status(result),
+                    "date": str(datetime.datetime.now()),
+                    "history": []
+                }
+        elif self.previous_records is not None and result["owner__username"] in self.previous_records:
+            previous_record = self.previous_records[result["owner__username"]]
+            repos = previous_record["repos"]
+            # if repo already exist
+            if result["repo__name"] in repos:
+                append_history(repos[result["repo__name"]].setdefault("history", []),
+                               repos[result["repo__name"]]["status"], repos[result["repo__name"]]["date"])
+                repos[result["repo__name"]]["status"] = "Redetected"
+                repos[result["repo__name"]]["date"] = str(datetime.datetime.now())
+            else:
+                repos[result["repo__name"]] = {
+                    "repo__name": result["repo__name"],
+                    "repo__html_url": result["repo__html_url"],
+                    "status": self.new_status(result),
+                    "date": str(datetime.datetime.now()),
+                    "history": []
+                }
+            final_result_dict[result["owner__username"]] = previous_record
+        else:
+            final_result_dict[result["owner__username"]] = {
+                "owner__username": result["owner__username"],
+                "owner__name": result["owner__name"],
+                "owner__email": [result["owner__email"]],
+                "owner__html_url": result["owner__html_url"],
+                "repos": {
+                    result["repo__name"]: {
+                        "repo__name": result["repo__name"],
+                        "repo__html_url": result["repo__html_url"],
+                        "status": self.new_status(result),
+                        "date": str(datetime.datetime.now()),
+                        "history": []
+                    }
+                }
+            }
 
     def execute(self, targets=None, ignore_warning: bool = False, chain: bool = False):
         """
@@ -419,23 +645,55 @@ class FindRepoTask(BaseTask):
         :return:
         """
         if not targets:
-            return self.execute_search_by_code(ignore_warning=ignore_warning, chain=chain)
-        elif isinstance(targets, list):
-            results_of_different_targets = []
-            for target in targets:
-                if target == "repo":
-                    res = self.execute_search_by_repo(ignore_warning=ignore_warning, chain=True)
-                    if res:
-                        results_of_different_targets.append(res)
-                elif target == "code":
-                    res = self.execute_search_by_code(ignore_warning=ignore_warning, chain=True)
-                    if res:
-                        results_of_different_targets.append(res)
-            return self.merge(results_of_different_targets)
-        else:
-            if targets == "repo":
-                return self.execute_search_by_repo(ignore_warning=ignore_warning, chain=False)
-            elif targets == "code":
-                return self.execute_search_by_code(ignore_warning=ignore_warning, chain=False)
-            else:
+            targets = ["code"]
+        elif not isinstance(targets, list):
+            if targets not in ["repo", "code"]:
                 return None
+            targets = [targets]
+        targets = [target for target in targets if target in ["repo", "code"]]
+        if not targets:
+            return None
+
+        # the limiter starts from GitHub's budgets instead of assumed ones, e.g. when another run spent some
+        self.client.refresh_rate_limit()
+        final_result_dict = {}
+        repo_index = {}
+        self.__progress = {}
+        self.__shard_pages = {}
+        self.__grouped_repos = {}
+        if self.checkpoint and self.resume:
+            self.load_checkpoint(final_result_dict, repo_index)
+        # pages are appended to a fresh checkpoint, one left by a run that is not resumed is replaced
+        self.save_checkpoint(final_result_dict)
+        # every query of every target is searched concurrently, sharing the client's connection pool and rate
+        # limiter, the owner enricher and the repo index
+        searches = [(search_query, target) for search_query in self.search_queries for target in targets]
+
+        def search(query_target: tuple):
+            return self.execute_search(query_target[1], ignore_warning=ignore_warning, chain=True,
+                                       final_result_dict=final_result_dict, repo_index=repo_index,
+                                       search_query=query_target[0])
+
+        if len(searches) == 1:
+            # in the calling thread, so Ctrl-C stops it at once
+            search_results = [search(searches[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(searches), max(1, self.n_threads))) as executor:
+                search_results = list(executor.map(search, searches))
+        if len(searches) == 1 and search_results[0] is None:
+            return None
+        moved = self.history_archive.trim(final_result_dict)
+        if moved:
+            print("{} history entries moved out of the retention window.".format(moved))
+        # only the owners found in the run are written back
+        if isinstance(self.previous_records, RecordStore):
+            self.previous_records.save(final_result_dict)
+        if self.seen_index is not None:
+            self.seen_index.add(self.__grouped_repos)
+            self.seen_index.save()
+        # the checkpoint is kept while a search is unfinished, so a resumed run retries it
+        if self.checkpoint and all(search_result is not None for search_result in search_results):
+            self.checkpoint.clear()
+        if chain:
+            return final_result_dict
+        return self.format_results(final_result_dict)
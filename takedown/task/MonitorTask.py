@@ -0,0 +1,117 @@
+"""
+MonitorTask
+--------------------------------------------------
+Run find on a schedule in one long running process
+    1. One FindRepoTask serves every sweep, so its connection pool, rate limit state and owner caches stay warm
+    2. Only the repos that are new or changed status in a sweep are handed out as the delta of the sweep
+"""
+
+from .BaseTask import BaseTask
+from .FindRepoTask import FindRepoTask
+from takedown.storage.RecordStore import RecordStore
+import datetime
+import sys
+import time
+import typing
+
+# seconds between the starts of two sweeps
+DEFAULT_INTERVAL = 3600
+
+
+class MonitorTask(BaseTask):
+
+    def __init__(self, **config):
+        """
+        init monitor
+        :param config: configs of FindRepoTask, and
+                       interval: seconds between the starts of two sweeps
+                       sweeps: number of sweeps to run, endless by default
+        """
+        super().__init__(**config)
+        self.interval = config.get("interval", DEFAULT_INTERVAL)
+        self.sweeps = config.get("sweeps", None)
+        self.find_task = FindRepoTask(**{key: value for key, value in config.items()
+                                         if key not in ["interval", "sweeps"]})
+        # { owner__username: record } | RecordStore, all records known to the monitor
+        self.records = {}
+        self.targets = None
+
+    def prepare(self, token: typing.Union[str, list], search_query: typing.Union[str, list],
+                previous_records: typing.Union[dict, RecordStore] = None, targets=None):
+        """
+        prepare the monitor
+        :param token: input github token, or a list of tokens whose rate limits are pooled
+        :param search_query: input search_query, or a list of queries searched in every sweep
+        :param previous_records: previous records of searched repos, or a RecordStore
+        :param targets: targets of find, see FindRepoTask.execute()
+        :return: self instance
+        """
+        # an empty record store is still the one written to
+        self.records = previous_records if previous_records is not None else {}
+        self.targets = targets
+        self.find_task.prepare(token, search_query, self.records)
+        return self
+
+    def sweep(self):
+        """
+        search once and fold the results into the records
+        :return: None if the search failed, otherwise the delta of the sweep in the output format
+        """
+        started = str(datetime.datetime.now())
+        results = self.find_task.execute(self.targets, ignore_warning=True, chain=True)
+        if results is None:
+            return None
+        # a record store is updated by find itself
+        if not isinstance(self.records, RecordStore):
+            self.records.update(results)
+        self.find_task.set_previous_records(self.records)
+
+        delta = {
+            "results": []
+        }
+        for record in results.values():
+            # repos detected in the sweep whose status differs from the one before
+            changed = [
+                {**repo} for repo in record["repos"].values()
+                if str(repo["date"]) >= started
+                and (not repo["history"] or repo["history"][-1]["status"] != repo["status"])
+            ]
+            if changed:
+                delta["results"].append({
+                    **{key: value for key, value in record.items() if key != "repos"},
+                    "repos": changed
+                })
+        return delta
+
+    def execute(self, on_delta: typing.Callable = None, **kwargs):
+        """
+        run sweeps until the number of sweeps is reached or the monitor is interrupted by Ctrl-C
+        :param on_delta: function of the delta of a sweep, called when the delta is not empty
+        :return: { owner__username: record } | RecordStore, all records known to the monitor
+        """
+        count = 0
+        try:
+            while self.sweeps is None or count < self.sweeps:
+                started = time.time()
+                count += 1
+                print("Sweep {} started.".format(count))
+                delta = self.sweep()
+                if delta is None:
+                    print("Sweep {} failed, retry at the next sweep.".format(count), file=sys.stderr)
+                elif delta["results"]:
+                    print("Sweep {} found {} repos new or changed.".format(
+                        count, sum(len(record["repos"]) for record in delta["results"])
+                    ))
+                    if on_delta:
+                        on_delta(delta)
+                else:
+                    print("Sweep {} found nothing new.".format(count))
+                if self.sweeps is not None and count >= self.sweeps:
+                    break
+                # sweeps start at a steady pace however long each of them took
+                time.sleep(max(0.0, started + self.interval - time.time()))
+        except KeyboardInterrupt:
+            print("Monitor interrupted.")
+        finally:
+            self.find_task.client.close()
+        return self.records
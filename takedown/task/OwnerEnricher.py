@@ -0,0 +1,106 @@
+"""
+OwnerEnricher
+--------------------------------------------------
+Resolves the profiles of repo owners concurrently. Owners are looked up in batches through GraphQL, the ones it cannot
+resolve fall back to one REST request each. Requests for an owner that is already being resolved by another thread
+wait for that request instead of sending their own.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, Future
+from takedown.client.GitHub import GRAPHQL_BATCH_SIZE
+import threading
+import typing
+
+DEFAULT_ENRICH_THREADS = 8
+
+
+class OwnerEnricher:
+
+    def __init__(self, client, n_threads: int = DEFAULT_ENRICH_THREADS, cache: dict = None, owner_cache=None,
+                 lookup: typing.Callable = None):
+        """
+        init enricher
+        :param client: GitHubClient
+        :param n_threads: max number of owner requests in flight
+        :param cache: { owner__url: profile }, profiles already known, shared with the caller
+        :param owner_cache: None | OwnerCache, persistent profiles looked up before sending any request
+        :param lookup: None | function of a list of logins returning { login: profile } of the ones known before the
+        run, e.g. from previous records, looked up first
+        """
+        self.client = client
+        self.n_threads = max(1, n_threads)
+        self.cache = cache if cache is not None else {}
+        self.owner_cache = owner_cache
+        self.lookup = lookup
+        self.__lock = threading.Lock()
+        # owner__url: Future of the profile, for owners being resolved right now
+        self.__in_flight = {}
+
+    def enrich(self, owners: typing.Dict[str, tuple]) -> dict:
+        """
+        resolve the profiles of owners, thread safe
+        :param owners: { owner__url: (owner__login, owner__type, owner__id) }
+        :return: { owner__url: profile }, an empty dict for owners that cannot be resolved
+        """
+        waiting = []
+        claimed = {}
+        with self.__lock:
+            for url, owner in owners.items():
+                if self.cache.get(url):
+                    continue
+                if url in self.__in_flight:
+                    waiting.append(self.__in_flight[url])
+                else:
+                    self.__in_flight[url] = Future()
+                    claimed[url] = owner
+        if claimed:
+            self.__resolve(claimed)
+        for future in waiting:
+            future.result()
+        with self.__lock:
+            return {url: self.cache.get(url) or {} for url in owners}
+
+    def __resolve(self, owners: dict):
+        profiles = {}
+        try:
+            items = list(owners.items())
+            if self.lookup:
+                known = self.lookup([login for _, (login, _, _) in items])
+                for url, (login, _, _) in items:
+                    if login in known:
+                        profiles[url] = known[login]
+                items = [(url, owner) for url, owner in items if url not in profiles]
+            if self.owner_cache:
+                stored = self.owner_cache.get_many((login, owner_id) for _, (login, _, owner_id) in items)
+                for url, (login, _, _) in items:
+                    if login in stored:
+                        profiles[url] = stored[login]
+                items = [(url, owner) for url, owner in items if url not in profiles]
+            batches = [
+                [(login, owner_type) for _, (login, owner_type, _) in items[start:start + GRAPHQL_BATCH_SIZE]]
+                for start in range(0, len(items), GRAPHQL_BATCH_SIZE)
+            ]
+            fetched = {}
+            with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+                resolved = {}
+                for batch_profiles in executor.map(self.client.get_users, batches):
+                    resolved.update(batch_profiles)
+                for url, (login, _, _) in items:
+                    if login in resolved:
+                        fetched[url] = resolved[login]
+                missing = [url for url, _ in items if url not in fetched]
+                for url, profile in zip(missing, executor.map(self.client.get_user, missing)):
+                    fetched[url] = profile or {}
+            if self.owner_cache:
+                self.owner_cache.put_many((owners[url][2], profile) for url, profile in fetched.items())
+            profiles.update(fetched)
+            print("Owners resolved: {} from cache, {} through GraphQL, {} through REST.".format(
+                len(owners) - len(items), len(items) - len(missing), len(missing)
+            ))
+        finally:
+            # always release the waiting threads, owners that failed are left unresolved
+            with self.__lock:
+                for url in owners:
+                    if url in profiles:
+                        self.cache[url] = profiles[url]
+                    self.__in_flight.pop(url).set_result(profiles.get(url))
@@ -0,0 +1,89 @@
+"""
+Pipeline
+--------------------------------------------------
+A chain of stages connected by bounded queues. The source and every stage run in their own thread, so a slow stage
+works on one item while earlier stages already produce the next ones, and at most `queue_size` items wait between
+two stages at any time.
+"""
+
+from queue import Queue
+import threading
+import sys
+import typing
+
+# items waiting between two stages
+DEFAULT_QUEUE_SIZE = 4
+# marks the end of the items
+_END = object()
+
+
+class Pipeline:
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.stages = []
+        self.__failed = threading.Event()
+
+    def add_stage(self, stage: typing.Callable):
+        """
+        append a stage
+        :param stage: function of one item, returns the item passed to the next stage or None to drop it
+        :return: self instance
+        """
+        self.stages.append(stage)
+        return self
+
+    def __produce(self, source: typing.Iterable, output: Queue):
+        try:
+            for item in source:
+                if self.__failed.is_set():
+                    break
+                output.put(item)
+        except Exception as e:
+            self.__fail(e)
+        output.put(_END)
+
+    def __work(self, stage: typing.Callable, input_queue: Queue, output: Queue):
+        for item in iter(input_queue.get, _END):
+            # keep draining after a failure so upstream threads are never blocked on a full queue
+            if self.__failed.is_set():
+                continue
+            try:
+                result = stage(item)
+            except Exception as e:
+                self.__fail(e)
+                continue
+            if result is not None:
+                output.put(result)
+        output.put(_END)
+
+    def __fail(self, error: Exception):
+        print("Pipeline aborted: {}".format(error), file=sys.stderr)
+        self.__failed.set()
+
+    def run(self, source: typing.Iterable, sink: typing.Callable) -> bool:
+        """
+        push every item of source through the stages into sink
+        :param source: iterable of items, consumed in its own thread
+        :param sink: function of one item, run in the calling thread
+        :return: false if any stage raised, the items after the failure are dropped
+        """
+        self.__failed.clear()
+        queues = [Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self.__produce, args=(source, queues[0]), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads.append(
+                threading.Thread(target=self.__work, args=(stage, queues[index], queues[index + 1]), daemon=True)
+            )
+        for thread in threads:
+            thread.start()
+        for item in iter(queues[-1].get, _END):
+            if self.__failed.is_set():
+                continue
+            try:
+                sink(item)
+            except Exception as e:
+                self.__fail(e)
+        for thread in threads:
+            thread.join()
+        return not self.__failed.is_set()
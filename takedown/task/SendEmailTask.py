@@ -6,6 +6,8 @@ Run tool to send emails based on previous output
 """
 
 from .BaseTask import BaseTask
+from takedown.storage.RecordStore import RecordStore
+from takedown.storage.HistoryArchive import append_history
 import sys
 import smtplib
 from email.mime.multipart import MIMEMultipart
@@ -146,10 +148,17 @@ class SendEmailTask(BaseTask):
         preface = self.optional_params.get("preface", EMAIL_DEFAULT_PREFACE)
         ending = self.optional_params.get("ending", EMAIL_DEFAULT_ENDING)
 
+        # a record store is only read for the owners with a repo matching the tags
+        if isinstance(inputs, RecordStore):
+            store = inputs
+            user_keys = store.select(tags) if tags is not None else list(store)
+            inputs = {user_key: store[user_key] for user_key in user_keys}
+        else:
+            store = None
         for user_key in inputs:
             user = inputs[user_key]
             print("Try sending emails to {}...".format(user_key))
-            owner_emails = user["owner__email"]
+            owner_emails = user.get("owner__email") or []
             repos = user["repos"]
 
             # construct message
@@ -166,13 +175,10 @@ class SendEmailTask(BaseTask):
                 if tags is not None and repo["status"].lower() not in tags:
                     continue
                 repo_list.append("<li><a href='{}'>{}</a></li>".format(repo["repo__html_url"], repo["repo__name"]))
-                # update repo status
-                repo["history"].append({
-                    "status": repo["status"],
-                    "date": repo["date"]
-                })
+                # update repo status, a redetection following a redetection is merged into the last entry
+                append_history(repo.setdefault("history", []), repo["status"], repo["date"])
                 repo["status"] = "Waiting"
-                repo["date"] = datetime.datetime.now()
+                repo["date"] = str(datetime.datetime.now())
 
                 num_of_repos += 1
 
@@ -195,20 +201,14 @@ class SendEmailTask(BaseTask):
                 print("Error occurs when sending emails to {}".format(",".join(owner_emails)), file=sys.stderr)
                 print(str(e), file=sys.stderr)
 
-        # update outputs
+        # update outputs, only the owners read from a record store are written back and output
+        if store is not None:
+            store.save(inputs)
         final_result = {
-            "results": []
+            "results": [
+                {**user, "repos": [{**repo_info} for repo_info in user["repos"].values()]} for user in inputs.values()
+            ]
         }
-        for user in inputs.values():
-            repos = user.pop("repos")
-            final_result["results"].append(
-                {
-                    **user,
-                    "repos": [
-                        {**repo_info} for repo_info in repos.values()
-                    ]
-                }
-            )
 
         return final_result
 
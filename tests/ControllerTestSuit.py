@@ -1,11 +1,78 @@
 import unittest
+from unittest import mock
 import os
 import yaml
 import json
 import copy
+import shutil
+import tempfile
 from takedown.controller.InputReader import InputReader
-from takedown.controller.InputProcessor import load_previous_outputs_as_inputs
+from takedown.controller.InputProcessor import load_previous_outputs_as_inputs, load_output_file
+from concurrent.futures.process import BrokenProcessPool
 from takedown.controller.OutputParser import parse_intermediate_results
+from takedown.client.RateLimiter import RateLimit, RateLimiter
+from takedown.client.GitHub import GitHubClient
+from takedown.client.ResponseCache import ResponseCache
+from takedown.client.QuerySharder import QuerySharder, MAX_RESULTS
+from takedown.client.RetryPolicy import RetryPolicy, parse_retry_after
+from takedown.task.FindRepoTask import FindRepoTask, SEARCH_FIELDS
+from takedown.task.OwnerEnricher import OwnerEnricher
+from takedown.task.MonitorTask import MonitorTask
+from takedown.task.SendEmailTask import SendEmailTask
+from takedown.storage.Checkpoint import Checkpoint
+from takedown.storage.OwnerCache import OwnerCache
+from takedown.storage.RecordStore import RecordStore
+from takedown.storage.HistoryArchive import HistoryArchive, append_history, compact_history
+from takedown.storage.RepoIndex import RepoIndex, HEADER as REPO_INDEX_HEADER, MIN_BITS as REPO_INDEX_MIN_BITS
+from requests.exceptions import ConnectionError, InvalidURL
+import email.utils
+from requests.adapters import BaseAdapter
+from requests.models import Response
+import time
+import datetime
+import sqlite3
+import threading
+import typing
+import re
+import urllib.parse
+
+
+class FakeGitHubAdapter(BaseAdapter):
+    """
+    transport adapter answering the requests of a GitHubClient offline, mounted on its session
+    """
+
+    def __init__(self, handler):
+        """
+        :param handler: function of a prepared request, returns (status code, json body, headers) or raises
+        """
+        super().__init__()
+        self.handler = handler
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        status_code, body, headers = self.handler(request)
+        response = Response()
+        response.status_code = status_code
+        response._content = json.dumps(body).encode("utf-8")
+        response.encoding = "utf-8"
+        response.headers.update(headers or {})
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def fake_response(status_code: int = 200, body=None, headers: dict = None) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response._content = json.dumps(body or {}).encode("utf-8")
+    response.encoding = "utf-8"
+    response.headers.update(headers or {})
+    return response
 
 
 class InputReaderTester(unittest.TestCase):
@@ -86,6 +153,51 @@ class InputReaderTester(unittest.TestCase):
                               "-t", "repo", "abababa", "nonsence"])
         self.assertTrue(reader.prepare())
 
+    def test_find_complex_correct_input__with_pool_size(self):
+        reader = InputReader(["takedown", "find", "ReactJS Ant Design", "token - xxxxx", "-ps", "32"])
+        self.assertTrue(reader.prepare())
+        required, optional = reader.execute()
+        self.assertDictEqual(optional, {
+            "pool_size": 32
+        })
+
+    def test_find_complex_wrong_input__with_wrong_pool_size(self):
+        reader = InputReader(["takedown", "find", "ReactJS Ant Design", "token - xxxxx", "-ps", "zero"])
+        self.assertFalse(reader.prepare())
+        err_msg = reader.execute()
+        self.assertEqual(err_msg, "Pool size must be a positive integer.")
+
+    def test_find_complex_correct_input__with_query_file(self):
+        query_file = "./test_queries.tempfile"
+        with open(query_file, "w+") as f:
+            f.write("ecs150 assignment\n\n# skipped\necs36c assignment\n")
+        reader = InputReader(["takedown", "find", "ReactJS Ant Design", "token - xxxxx", "-q", query_file])
+        self.assertTrue(reader.prepare())
+        required, optional = reader.execute()
+        self.assertDictEqual(optional, {
+            "queries": ["ecs150 assignment", "ecs36c assignment"]
+        })
+        # remove temp file
+        os.remove(query_file)
+
+    def test_find_complex_wrong_input__resume_without_checkpoint(self):
+        reader = InputReader(["takedown", "find", "ReactJS Ant Design", "token - xxxxx", "--resume", "-t", "repo"])
+        self.assertFalse(reader.prepare())
+        err_msg = reader.execute()
+        self.assertEqual(err_msg, "Flag '--resume' requires a checkpoint file given by '-cp'.")
+
+    def test_monitor_complex_correct_input__with_interval(self):
+        reader = InputReader(["takedown", "monitor", "ReactJS Ant Design", "token - xxxxx", "-t", "repo", "-iv", "30",
+                              "-sw", "2"])
+        self.assertTrue(reader.prepare())
+        required, optional = reader.execute()
+        self.assertEqual(reader.command_type, "monitor")
+        self.assertDictEqual(optional, {
+            "targets": ["repo"],
+            "interval": 1800,
+            "sweeps": 2
+        })
+
     def test_send_simple_correct_input(self):
         input1 = "temp_input.json"
         f1 = open(input1, "w+")
@@ -384,6 +496,33 @@ class InputProcessorTester(unittest.TestCase):
         os.remove("./input_file1.tempfile")
         os.remove("./input_file2.tempfile")
 
+    def test_two_files__correct_input_into_record_store(self):
+        temp_input_file = open("./input_file1.tempfile", "w+")
+        json.dump(self.test_sample1, temp_input_file)
+        temp_input_file.close()
+        temp_input_file = open("./input_file2.tempfile", "w+")
+        yaml.dump(self.test_sample2, temp_input_file)
+        temp_input_file.close()
+
+        # test
+        store = load_previous_outputs_as_inputs(["./input_file1.tempfile", "./input_file2.tempfile",
+                                                 "./records.tempfile.db"])
+        self.assertEqual(len(store), 2)
+        for username, record in self.test_sample12_combined_parsed.items():
+            self.assertEqual(store[username]["owner__name"], record["owner__name"])
+            self.assertDictEqual(store[username]["repos"], {
+                repo_name: {**repo, "history": []} for repo_name, repo in record["repos"].items()
+            })
+        self.assertListEqual(store.select(["waiting"]), ["haha_example_name"])
+        store.close()
+
+        # remove files
+        os.remove("./input_file1.tempfile")
+        os.remove("./input_file2.tempfile")
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.exists("./records.tempfile.db" + suffix):
+                os.remove("./records.tempfile.db" + suffix)
+
     def test_single_file__wrong_input(self):
         # create temp input file for test
         temp_input_file = open("./input_file1.tempfile", "w+")
@@ -396,6 +535,103 @@ class InputProcessorTester(unittest.TestCase):
         # remove files
         os.remove("./input_file1.tempfile")
 
+    def write_files(self, contents: dict) -> dict:
+        """
+        :param contents: { file name: text }
+        :return: { file name: path of the file written to a temp directory }
+        """
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        paths = {}
+        for file_name, text in contents.items():
+            paths[file_name] = os.path.join(temp_dir, file_name)
+            with open(paths[file_name], "w") as file:
+                file.write(text)
+        return paths
+
+    def test_load_output_file__format_told_by_extension_or_content(self):
+        json_text = json.dumps(self.test_sample1)
+        yaml_text = yaml.dump(self.test_sample1)
+        paths = self.write_files({
+            "sample.json": json_text, "sample.yaml": yaml_text, "json.txt": json_text, "yaml.txt": yaml_text,
+            "yaml.json": yaml_text, "json.yml": json_text
+        })
+
+        with mock.patch("takedown.controller.InputProcessor.yaml.load", wraps=yaml.load) as yaml_load:
+            # json told by its extension or its first character is parsed without the yaml parser
+            for file_name in ["sample.json", "json.txt"]:
+                self.assertEqual(load_output_file(paths[file_name]), self.test_sample1)
+            yaml_load.assert_not_called()
+            # a yaml extension or content goes to the yaml parser, a .json file only after json failed
+            for file_name in ["sample.yaml", "yaml.txt", "yaml.json", "json.yml"]:
+                self.assertEqual(load_output_file(paths[file_name]), self.test_sample1)
+            self.assertEqual(yaml_load.call_count, 4)
+
+    def test_load_output_file__json_never_goes_through_yaml(self):
+        paths = self.write_files({"sample.json": json.dumps(self.test_sample1),
+                                  "sample.tempfile": json.dumps(self.test_sample1)})
+
+        with mock.patch("takedown.controller.InputProcessor.yaml.load") as yaml_load:
+            self.assertDictEqual(load_previous_outputs_as_inputs([paths["sample.json"]]), self.test_sample1_parsed)
+            self.assertDictEqual(load_previous_outputs_as_inputs([paths["sample.tempfile"]]), self.test_sample1_parsed)
+        yaml_load.assert_not_called()
+
+    @staticmethod
+    def results(*records: tuple) -> str:
+        """
+        :param records: (owner__username, owner__name, [(repo__name, status, date)])
+        :return: json text of an output file
+        """
+        return json.dumps({"results": [{
+            "owner__username": username, "owner__name": name, "owner__email": None,
+            "owner__html_url": "https://github.com/" + username,
+            "repos": [{"repo__name": repo_name, "status": status, "date": date,
+                       "repo__html_url": "https://github.com/{}/{}".format(username, repo_name)}
+                      for repo_name, status, date in repos]
+        } for username, name, repos in records]})
+
+    def test_multiple_files__first_profile_and_latest_repo_win(self):
+        paths = self.write_files({
+            "1.json": self.results(("alice", "First", [("a", "New", "2021-01-01 00:00:00")])),
+            "2.json": self.results(("alice", "Second", [("a", "Waiting", "2021-01-03 00:00:00"),
+                                                        ("b", "New", "2021-01-01 00:00:00")])),
+            "3.json": self.results(("bob", "Bob", [("c", "New", "2021-01-01 00:00:00")])),
+            "4.json": self.results(("alice", "Fourth", [("b", "Waiting", "2021-01-05 00:00:00")])),
+            "5.json": self.results(("alice", "Fifth", [("a", "Redetected", "2021-01-02 00:00:00")]),
+                                   ("bob", "Other Bob", [("c", "Waiting", "2020-12-01 00:00:00")]))
+        })
+        # files are parsed by a real pool of processes, even on one cpu
+        with mock.patch("takedown.controller.InputProcessor.os.cpu_count", return_value=4):
+            records = load_previous_outputs_as_inputs([paths[file_name] for file_name in sorted(paths)])
+
+        # profiles are the ones of the first file an owner appears in
+        self.assertEqual(records["alice"]["owner__name"], "First")
+        self.assertEqual(records["bob"]["owner__name"], "Bob")
+        # repos keep the status scanned latest, whichever file it comes from
+        repos = records["alice"]["repos"]
+        self.assertEqual({repo_name: (repo["status"], repo["date"]) for repo_name, repo in repos.items()},
+                         {"a": ("Waiting", "2021-01-03 00:00:00"), "b": ("Waiting", "2021-01-05 00:00:00")})
+        self.assertEqual(records["bob"]["repos"]["c"]["status"], "New")
+
+    def test_multiple_files__loaded_one_by_one_when_pool_breaks(self):
+        paths = self.write_files({"1.json": json.dumps(self.test_sample1), "2.yaml": yaml.dump(self.test_sample2)})
+        with mock.patch("takedown.controller.InputProcessor.os.cpu_count", return_value=4), \
+                mock.patch("takedown.controller.InputProcessor.ProcessPoolExecutor") as pool:
+            pool.return_value.__enter__.return_value.map.side_effect = BrokenProcessPool("worker killed")
+            records = load_previous_outputs_as_inputs([paths["1.json"], paths["2.yaml"]])
+
+        self.assertEqual(pool.call_args.kwargs["max_workers"], 2)
+        self.assertDictEqual(records, self.test_sample12_combined_parsed)
+
+    def test_multiple_files__no_pool_on_one_cpu(self):
+        paths = self.write_files({"1.json": json.dumps(self.test_sample1), "2.yaml": yaml.dump(self.test_sample2)})
+        with mock.patch("takedown.controller.InputProcessor.os.cpu_count", return_value=1), \
+                mock.patch("takedown.controller.InputProcessor.ProcessPoolExecutor") as pool:
+            records = load_previous_outputs_as_inputs([paths["1.json"], paths["2.yaml"]])
+
+        pool.assert_not_called()
+        self.assertDictEqual(records, self.test_sample12_combined_parsed)
+
 
 class OutputParserTester(unittest.TestCase):
 
@@ -459,5 +695,933 @@ class OutputParserTester(unittest.TestCase):
         os.remove("./test_sample1.tempfile")
 
 
+class RateLimiterTester(unittest.TestCase):
+
+    def test_window_reset__restores_budget(self):
+        rate = RateLimit("search", 30, 60)
+        now = time.time()
+        rate.remaining = 0
+        rate.reset = now - 1
+        self.assertEqual(rate.delay(now), 0.0)
+        self.assertEqual(rate.remaining, 30)
+        self.assertAlmostEqual(rate.reset, now + 60)
+
+    def test_exhausted_budget__waits_for_reset(self):
+        rate = RateLimit("search", 30, 60)
+        now = time.time()
+        rate.remaining = 0
+        rate.reset = now + 20
+        self.assertAlmostEqual(rate.delay(now), 20)
+
+    def test_pacing__spreads_low_budget_until_reset(self):
+        rate = RateLimit("core", 100, 3600)
+        now = time.time()
+        rate.reset = now + 40
+        rate.last_sent = now
+        # plenty of budget, no pacing
+        rate.remaining = 50
+        self.assertEqual(rate.delay(now), 0.0)
+        # a quarter left, 20 requests over 40 seconds
+        rate.remaining = 20
+        self.assertAlmostEqual(rate.delay(now), 2.0)
+        # the interval is recomputed from the time left
+        self.assertAlmostEqual(rate.delay(now + 1.5), 38.5 / 20 - 1.5)
+
+    def test_update__primary_rate_limit_rejection(self):
+        limiter = RateLimiter()
+        reset = int(time.time()) + 30
+        rejected = limiter.update("search", fake_response(403, {"message": "API rate limit exceeded"}, {
+            "X-RateLimit-Limit": "30", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(reset)
+        }))
+        self.assertTrue(rejected)
+        self.assertEqual(limiter.remaining("search")["remaining"], 0)
+        self.assertGreater(limiter.try_acquire("search"), 0)
+
+
+class TokenPoolTester(unittest.TestCase):
+
+    def setUp(self):
+        self.client = GitHubClient().authenticate(["token-a", "token-b"])
+        self.adapter = FakeGitHubAdapter(
+            lambda request: (200, {"login": request.url.rsplit("/", 1)[1], "name": None, "email": None,
+                                   "html_url": "https://github.com/user"}, {})
+        )
+        self.client.session.mount("https://", self.adapter)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_exhausted_token__is_skipped(self):
+        self.client.token_pool.limiter("token-a").sync("core", 5000, 0, int(time.time()) + 600)
+        for _ in range(3):
+            self.assertEqual(self.client.get_user("https://api.github.com/users/user")["login"], "user")
+        self.assertEqual([request.headers["Authorization"] for request in self.adapter.requests],
+                         ["token token-b"] * 3)
+
+    def test_token_with_most_budget__is_used(self):
+        reset = int(time.time()) + 600
+        self.client.token_pool.limiter("token-a").sync("core", 5000, 4000, reset)
+        self.client.token_pool.limiter("token-b").sync("core", 5000, 100, reset)
+        self.client.get_user("https://api.github.com/users/user")
+        self.assertEqual(self.adapter.requests[0].headers["Authorization"], "token token-a")
+        self.assertEqual(self.client.rate_limit("core")["remaining"], 4099)
+
+
+class ResponseCacheTester(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_path)
+
+    def test_not_modified__replays_cached_body(self):
+        profile = {"login": "user", "name": "User", "email": None, "html_url": "https://github.com/user"}
+
+        def handler(request):
+            if request.headers.get("If-None-Match") == '"v1"':
+                return 304, None, {"ETag": '"v1"'}
+            return 200, profile, {"ETag": '"v1"'}
+
+        client = GitHubClient(cache_path=self.cache_path).authenticate("token")
+        adapter = FakeGitHubAdapter(handler)
+        client.session.mount("https://", adapter)
+        self.assertDictEqual(client.get_user("https://api.github.com/users/user"), profile)
+        self.assertDictEqual(client.get_user("https://api.github.com/users/user"), profile)
+        client.close()
+
+        self.assertNotIn("If-None-Match", adapter.requests[0].headers)
+        self.assertEqual(adapter.requests[1].headers["If-None-Match"], '"v1"')
+        self.assertEqual(client.cache_stats()["hits"], 1)
+        self.assertEqual(client.cache_stats()["misses"], 1)
+        # the 304 is not counted against the budget
+        self.assertEqual(client.rate_limit("core")["remaining"], 4999)
+
+    def test_full_cache__evicts_least_recently_used(self):
+        cache = ResponseCache(self.cache_path, max_size=1000)
+        for index in range(3):
+            cache.store("https://api.github.com/{}".format(index), "token",
+                        fake_response(body="x" * 200, headers={"ETag": '"{}"'.format(index)}))
+        # entry 0 was used most recently
+        now = time.time()
+        for name in os.listdir(self.cache_path):
+            with open(os.path.join(self.cache_path, name)) as file:
+                index = int(json.load(file)["url"].rsplit("/", 1)[1])
+            last_used = now - 100 + (10 if index == 0 else index)
+            os.utime(os.path.join(self.cache_path, name), (last_used, last_used))
+        cache.store("https://api.github.com/3", "token", fake_response(body="x" * 200, headers={"ETag": '"3"'}))
+
+        self.assertLessEqual(cache.stats()["size"], 750)
+        self.assertEqual(cache.stats()["size"], sum(
+            os.path.getsize(os.path.join(self.cache_path, name)) for name in os.listdir(self.cache_path)
+        ))
+        self.assertIsNotNone(cache.get("https://api.github.com/0", "token"))
+        self.assertIsNone(cache.get("https://api.github.com/1", "token"))
+        self.assertIsNone(cache.get("https://api.github.com/2", "token"))
+        self.assertIsNotNone(cache.get("https://api.github.com/3", "token"))
+
+
+def fake_code_search(n_files: int, files_per_repo: int = 2):
+    """
+    handler of code searches over n_files files, file i has size 100 * i and belongs to repo i // files_per_repo.
+    Pages link to the next one as GitHub does, with a cursor parameter only found in the links.
+    """
+    def handler(request):
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query)
+        size = re.search(r"size:(\d+)\.\.(\d+)", params["q"][0])
+        low, high = (int(size.group(1)), int(size.group(2))) if size else (0, 100 * n_files)
+        files = [index for index in range(n_files) if low <= 100 * index <= high]
+        page = int(params["page"][0])
+        items = [{
+            "name": "file{}".format(index),
+            "repository": {
+                "id": index // files_per_repo,
+                "name": "repo{}".format(index // files_per_repo),
+                "html_url": "https://github.com/owner/repo{}".format(index // files_per_repo),
+                "owner": {"login": "owner", "type": "User", "url": "https://api.github.com/users/owner",
+                          "html_url": "https://github.com/owner"}
+            }
+        } for index in files[(page - 1) * 100:page * 100]]
+        headers = {
+            "X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "5000",
+            "X-RateLimit-Reset": str(int(time.time()) + 60)
+        }
+        if page * 100 < min(len(files), 1000):
+            next_url = re.sub(r"([?&])page=\d+(&cursor=\d+)?", r"\g<1>page={0}&cursor={0}".format(page + 1),
+                              request.url)
+            headers["Link"] = '<{}>; rel="next"'.format(next_url)
+        return 200, {"total_count": len(files), "incomplete_results": False, "items": items}, headers
+    return handler
+
+
+class SearchIteratorTester(unittest.TestCase):
+
+    def setUp(self):
+        self.client = GitHubClient().authenticate("token")
+        self.adapter = FakeGitHubAdapter(fake_code_search(450, files_per_repo=1))
+        self.client.session.mount("https://", self.adapter)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_iter_search__follows_link_headers(self):
+        items = list(self.client.iter_search("takedown", "code", fields=["repo__id"]))
+
+        self.assertEqual([item["repo__id"] for item in items], list(range(450)))
+        urls = [request.url for request in self.adapter.requests]
+        self.assertEqual(len(urls), 5)
+        # pages after the first are requested by the links of the previous page
+        self.assertNotIn("cursor", urls[0])
+        for page, url in enumerate(urls[1:], 2):
+            self.assertIn("page={0}&cursor={0}".format(page), url)
+
+    def test_iter_search__max_items_stops_paging(self):
+        items = list(self.client.iter_search("takedown", "code", fields=["repo__id"], max_items=150))
+        self.assertEqual(len(items), 150)
+        self.assertEqual(len(self.adapter.requests), 2)
+
+        items = list(self.client.iter_search("takedown", "code", fields=["repo__id"], max_items=100))
+        self.assertEqual(len(items), 100)
+        self.assertEqual(len(self.adapter.requests), 3)
+
+    def test_iter_search__prefetches_next_page(self):
+        items = self.client.iter_search("takedown", "code", fields=["repo__id"])
+        self.assertEqual(next(items), {"repo__id": 0})
+        items.close()
+        # the next page was requested while the first one was consumed
+        self.assertEqual(len(self.adapter.requests), 2)
+
+        items = self.client.iter_search("takedown", "code", fields=["repo__id"], prefetch=False)
+        self.assertEqual(next(items), {"repo__id": 0})
+        items.close()
+        self.assertEqual(len(self.adapter.requests), 3)
+
+    def test_iter_search_pages__failed_page_raises(self):
+        self.adapter.handler = lambda request: (500, {"message": "Server Error"}, {})
+        self.client.retry_policy.max_attempts = 1
+        with self.assertRaises(RuntimeError):
+            list(self.client.iter_search_pages("takedown", "code", page=2))
+        self.assertEqual(list(self.client.iter_search("takedown", "code")), [])
+
+
+class QuerySharderTester(unittest.TestCase):
+
+    def test_search_over_cap__is_sharded_and_deduped_by_repo(self):
+        client = GitHubClient().authenticate("token")
+        adapter = FakeGitHubAdapter(fake_code_search(3500))
+        client.session.mount("https://", adapter)
+        results = QuerySharder(client, n_threads=4).search("takedown", "code", fields=["repo__name"])
+        client.close()
+
+        self.assertEqual(len(results), 1750)
+        self.assertEqual(sorted(results.generate_list("repo__id")), list(range(1750)))
+        queries = [urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query) for request in adapter.requests]
+        self.assertEqual(queries[0]["q"][0], "takedown size:0..393216")
+        # every page of every shard is fetched once
+        pages = [(query["q"][0], query["page"][0]) for query in queries]
+        self.assertEqual(len(pages), len(set(pages)))
+        # shards are split until none is over the cap
+        leaves = [query["q"][0] for query in queries if query["page"][0] == "2"]
+        for leaf in leaves:
+            low, high = map(int, re.search(r"size:(\d+)\.\.(\d+)", leaf).groups())
+            self.assertLessEqual(len(range(-(-low // 100), high // 100 + 1)), MAX_RESULTS)
+
+    def test_search_with_known_total__skips_root_query(self):
+        client = GitHubClient().authenticate("token")
+        adapter = FakeGitHubAdapter(fake_code_search(3500))
+        client.session.mount("https://", adapter)
+        results = QuerySharder(client, n_threads=4).search("takedown", "code", fields=["repo__name"], total=3500)
+        client.close()
+
+        self.assertEqual(len(results), 1750)
+        queries = [urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query)["q"][0]
+                   for request in adapter.requests]
+        self.assertNotIn("takedown size:0..393216", queries)
+        # planning starts from the halves of the range
+        self.assertIn("takedown size:0..196608", queries)
+        self.assertIn("takedown size:196609..393216", queries)
+
+
+class RetryPolicyTester(unittest.TestCase):
+
+    def setUp(self):
+        self.client = GitHubClient().authenticate("token")
+        self.client.retry_policy.base_delay = 0.01
+        self.responses = []
+        self.adapter = FakeGitHubAdapter(lambda request: self.responses.pop(0)())
+        self.client.session.mount("https://", self.adapter)
+
+    def tearDown(self):
+        self.client.close()
+
+    @staticmethod
+    def raise_error(error):
+        def send():
+            raise error
+        return send
+
+    def test_fatal_error__is_not_retried(self):
+        self.responses = [self.raise_error(InvalidURL("bad url"))] * 5
+        self.assertIsNone(self.client.get_user("https://api.github.com/users/user"))
+        self.assertEqual(len(self.adapter.requests), 1)
+
+    def test_connection_error__is_retried(self):
+        self.responses = [self.raise_error(ConnectionError("reset")), lambda: (502, {}, {}),
+                          lambda: (200, {"login": "user"}, {})]
+        self.assertEqual(self.client.get_user("https://api.github.com/users/user")["login"], "user")
+        self.assertEqual(len(self.adapter.requests), 3)
+
+    def test_retry_after__seconds_and_http_date(self):
+        self.assertEqual(parse_retry_after("12"), 12.0)
+        self.assertAlmostEqual(parse_retry_after(email.utils.formatdate(time.time() + 30, usegmt=True)), 30, delta=2)
+        self.assertEqual(parse_retry_after(email.utils.formatdate(time.time() - 30, usegmt=True)), 0.0)
+        self.assertIsNone(parse_retry_after("soon"))
+
+        date = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(RetryPolicy().backoff(1, fake_response(503, headers={"Retry-After": date})), 30, delta=2)
+        limiter = RateLimiter()
+        self.assertTrue(limiter.update("core", fake_response(429, headers={"Retry-After": date})))
+        self.assertGreater(limiter.try_acquire("core"), 25)
+
+
+class RepoIndexTester(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.temp_dir, "seen.idx")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def read_header(self) -> tuple:
+        with open(self.index_path, "rb") as file:
+            return REPO_INDEX_HEADER.unpack(file.read(REPO_INDEX_HEADER.size))
+
+    def test_save_load__round_trip(self):
+        index = RepoIndex(self.index_path)
+        index.add([42, 7, 1 << 40, 7, None])
+        index.save()
+
+        index = RepoIndex(self.index_path)
+        self.assertEqual(len(index), 3)
+        for repo_id in [42, 7, 1 << 40]:
+            self.assertIn(repo_id, index)
+        for repo_id in [0, 8, 43, None]:
+            self.assertNotIn(repo_id, index)
+
+    def test_add__found_before_flush(self):
+        index = RepoIndex(self.index_path)
+        index.add(range(0, 100, 2))
+        index.save()
+        index.add([1, 3])
+        # pending ids are found and counted once, before they are merged into the sorted array
+        index.add([1])
+        self.assertIn(1, index)
+        self.assertIn(3, index)
+        self.assertIn(98, index)
+        self.assertNotIn(5, index)
+        self.assertEqual(len(index), 52)
+        self.assertFalse(os.path.exists(self.index_path + ".tmp"))
+
+    def test_flush__resizes_bloom_filter(self):
+        index = RepoIndex(self.index_path)
+        index.add(range(100))
+        index.save()
+        self.assertEqual(self.read_header()[3], REPO_INDEX_MIN_BITS)
+
+        # past MIN_BITS / BITS_PER_ID ids the filter is rebuilt larger
+        index.add(range(100, 5000))
+        index.flush()
+        index.save()
+        self.assertGreater(self.read_header()[3], REPO_INDEX_MIN_BITS)
+        self.assertEqual(self.read_header()[2], 5000)
+        index = RepoIndex(self.index_path)
+        self.assertTrue(all(repo_id in index for repo_id in range(5000)))
+        self.assertLess(sum(repo_id in index for repo_id in range(5000, 15000)), 100)
+
+    def test_unknown_format__starts_empty(self):
+        with open(self.index_path, "wb") as file:
+            file.write(REPO_INDEX_HEADER.pack(b"NOPE", 1, 3, REPO_INDEX_MIN_BITS, 7))
+            file.write(b"\0" * 64)
+        index = RepoIndex(self.index_path)
+        self.assertEqual(len(index), 0)
+        self.assertNotIn(1, index)
+        # the index is usable and replaces the file on save
+        index.add([1])
+        index.save()
+        self.assertEqual(self.read_header()[:3], (b"TDRI", 1, 1))
+
+
+class OwnerCacheTester(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.now = 1000000.0
+        clock = mock.patch("takedown.storage.OwnerCache.time")
+        clock.start().time.side_effect = lambda: self.now
+        self.addCleanup(clock.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def create_cache(self, **config) -> OwnerCache:
+        cache = OwnerCache(os.path.join(self.temp_dir, "owners.db"), **config)
+        self.addCleanup(cache.close)
+        return cache
+
+    @staticmethod
+    def profile(login: str, email: str = None) -> dict:
+        return {"login": login, "name": login.upper(), "email": email, "html_url": "https://github.com/" + login}
+
+    def test_get_many__profiles_expire_after_ttl(self):
+        cache = self.create_cache(ttl=100, negative_ttl=100)
+        cache.put_many([(1, self.profile("Alice", "alice@example.com"))])
+
+        self.now += 99
+        # logins are matched case insensitively, the stored profile keeps its case
+        self.assertEqual(cache.get_many([("alice", 1)]), {"alice": {**self.profile("Alice", "alice@example.com"),
+                                                                    "id": 1}})
+        self.now += 1
+        self.assertEqual(cache.get_many([("alice", 1)]), {})
+
+    def test_get_many__profiles_without_email_expire_sooner(self):
+        cache = self.create_cache(ttl=100, negative_ttl=10)
+        cache.put_many([(1, self.profile("alice", "alice@example.com")), (2, self.profile("bob"))])
+
+        self.now += 10
+        self.assertEqual(set(cache.get_many([("alice", 1), ("bob", 2)])), {"alice"})
+        # a profile stored again with an email lives for the full ttl
+        cache.put_many([(2, self.profile("bob", "bob@example.com"))])
+        self.now += 50
+        self.assertEqual(set(cache.get_many([("alice", 1), ("bob", 2)])), {"alice", "bob"})
+
+    def test_put_many__evicts_oldest_profiles(self):
+        cache = self.create_cache(max_entries=3)
+        for index in range(5):
+            cache.put_many([(index, self.profile("user{}".format(index), "user@example.com"))])
+            self.now += 1
+
+        self.assertEqual(set(cache.get_many(("user{}".format(index), index) for index in range(5))),
+                         {"user2", "user3", "user4"})
+
+    def test_get_many__login_of_another_owner_is_rejected(self):
+        cache = self.create_cache()
+        cache.put_many([(1, self.profile("alice", "alice@example.com"))])
+
+        # the login was released and taken by the account of id 2
+        self.assertEqual(cache.get_many([("alice", 2)]), {})
+        # owners whose id is not known are matched by login
+        self.assertEqual(set(cache.get_many([("alice", None)])), {"alice"})
+        # another process sees the profiles stored
+        self.assertEqual(set(self.create_cache().get_many([("alice", 1)])), {"alice"})
+
+
+class HistoryArchiveTester(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.archive_path = os.path.join(self.temp_dir, "history.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_redetections__run_length_encoded(self):
+        history = []
+        append_history(history, "New", "2021-01-01 00:00:00")
+        for day in range(2, 5):
+            append_history(history, "Redetected", "2021-01-0{} 00:00:00".format(day))
+        append_history(history, "Waiting", "2021-01-05 00:00:00")
+        append_history(history, "Redetected", "2021-01-06 00:00:00")
+        self.assertEqual(history, [
+            {"date": "2021-01-01 00:00:00", "status": "New"},
+            {"date": "2021-01-02 00:00:00", "status": "Redetected", "last_date": "2021-01-04 00:00:00", "count": 3},
+            {"date": "2021-01-05 00:00:00", "status": "Waiting"},
+            {"date": "2021-01-06 00:00:00", "status": "Redetected"}
+        ])
+
+        # histories written before the encoding, or partly encoded, compact to the same entries
+        expanded = [{"date": "2021-01-01 00:00:00", "status": "New"},
+                    {"date": "2021-01-02 00:00:00", "status": "Redetected"},
+                    {"date": "2021-01-03 00:00:00", "status": "Redetected", "last_date": "2021-01-04 00:00:00",
+                     "count": 2},
+                    {"date": "2021-01-05 00:00:00", "status": "Waiting"},
+                    {"date": "2021-01-06 00:00:00", "status": "Redetected"}]
+        self.assertEqual(compact_history(expanded), history)
+        self.assertEqual(compact_history(history), history)
+
+    def test_trim__archives_history_out_of_retention(self):
+        now = datetime.datetime.now()
+        old, recent = str(now - datetime.timedelta(days=40)), str(now - datetime.timedelta(days=5))
+        records = {"alice": {"repos": {
+            "a": {"history": [{"date": old, "status": "New"},
+                              {"date": old, "status": "Redetected"},
+                              {"date": old, "status": "Redetected", "last_date": recent},
+                              {"date": recent, "status": "Waiting"}]},
+            "b": {"history": [{"date": old, "status": "New"}]},
+            "c": {"history": [{"date": recent, "status": "New"}]},
+            "d": {}
+        }}}
+        archive = HistoryArchive(self.archive_path, retention=30 * 24 * 3600)
+
+        # a redetection run is kept while its last date is in the window
+        self.assertEqual(archive.trim(records), 2)
+        repos = records["alice"]["repos"]
+        self.assertEqual(repos["a"]["history"], [
+            {"date": old, "status": "Redetected", "last_date": recent, "count": 2},
+            {"date": recent, "status": "Waiting"}
+        ])
+        self.assertEqual(repos["b"]["history"], [])
+        self.assertEqual(repos["c"]["history"], [{"date": recent, "status": "New"}])
+        self.assertNotIn("history", repos["d"])
+
+        with open(self.archive_path) as file:
+            lines = [json.loads(line) for line in file]
+        self.assertEqual(lines, [
+            {"owner__username": "alice", "repo__name": "a", "history": [{"date": old, "status": "New"}]},
+            {"owner__username": "alice", "repo__name": "b", "history": [{"date": old, "status": "New"}]}
+        ])
+
+    def test_load__reads_archived_history_on_demand(self):
+        now = datetime.datetime.now()
+        archive = HistoryArchive(self.archive_path, retention=24 * 3600)
+        for day in (30, 20):
+            date = str(now - datetime.timedelta(days=day))
+            archive.trim({"alice": {"repos": {"a": {"history": [{"date": date, "status": "Waiting"}]},
+                                              "b": {"history": [{"date": date, "status": "New"}]}}},
+                          "bob": {"repos": {"a": {"history": [{"date": date, "status": "New"}]}}}})
+
+        self.assertEqual(set(archive.load()), {("alice", "a"), ("alice", "b"), ("bob", "a")})
+        self.assertEqual(set(archive.load(username="alice")), {("alice", "a"), ("alice", "b")})
+        history = archive.load("alice", "a")[("alice", "a")]
+        # entries of later trims follow the earlier ones
+        self.assertEqual([entry["date"] for entry in history],
+                         [str(now - datetime.timedelta(days=30)), str(now - datetime.timedelta(days=20))])
+        self.assertEqual(HistoryArchive(os.path.join(self.temp_dir, "missing.jsonl")).load(), {})
+
+    def test_record_store__migrates_history_columns(self):
+        store_path = os.path.join(self.temp_dir, "records.db")
+        connection = sqlite3.connect(store_path)
+        with connection:
+            connection.execute("CREATE TABLE owners (username TEXT PRIMARY KEY, name TEXT, emails TEXT, "
+                               "html_url TEXT)")
+            connection.execute("CREATE TABLE repos (repo_key INTEGER PRIMARY KEY, username TEXT NOT NULL, "
+                               "repo_name TEXT NOT NULL, repo_html_url TEXT, status TEXT, date TEXT, queries TEXT, "
+                               "UNIQUE (username, repo_name))")
+            connection.execute("CREATE TABLE history (repo_key INTEGER NOT NULL, position INTEGER NOT NULL, "
+                               "status TEXT, date TEXT, PRIMARY KEY (repo_key, position))")
+            connection.execute("INSERT INTO owners VALUES ('alice', 'Alice', '[]', 'https://github.com/alice')")
+            connection.execute("INSERT INTO repos VALUES (1, 'alice', 'a', NULL, 'Redetected', "
+                               "'2021-01-03 00:00:00', NULL)")
+            connection.execute("INSERT INTO history VALUES (1, 0, 'New', '2021-01-01 00:00:00')")
+        connection.close()
+
+        store = RecordStore(store_path)
+        self.assertEqual(store["alice"]["repos"]["a"]["history"], [{"date": "2021-01-01 00:00:00", "status": "New"}])
+        record = copy.deepcopy(store["alice"])
+        record["repos"]["a"]["history"].append({"date": "2021-01-02 00:00:00", "status": "Redetected",
+                                                "last_date": "2021-01-03 00:00:00", "count": 2})
+        store.save([record])
+        store.close()
+
+        store = RecordStore(store_path)
+        self.assertEqual(store["alice"]["repos"]["a"]["history"], record["repos"]["a"]["history"])
+        store.close()
+
+
+def fake_repo_search(n_repos: int):
+    """
+    handler of repo searches over n_repos repos sorted newest first, repo i was updated i hours before the newest
+    """
+    newest = datetime.datetime(2021, 6, 1)
+
+    def handler(request):
+        page = int(urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query)["page"][0])
+        items = [{
+            "id": index,
+            "name": "repo{}".format(index),
+            "html_url": "https://github.com/owner/repo{}".format(index),
+            "updated_at": (newest - datetime.timedelta(hours=index)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "owner": {"login": "owner", "type": "User", "url": "https://api.github.com/users/owner",
+                      "html_url": "https://github.com/owner"}
+        } for index in range((page - 1) * 100, min(page * 100, n_repos))]
+        headers = {}
+        if page * 100 < n_repos:
+            headers["Link"] = '<{}>; rel="next"'.format(re.sub(r"page=\d+", "page={}".format(page + 1), request.url))
+        return 200, {"total_count": n_repos, "incomplete_results": False, "items": items}, headers
+    return handler
+
+
+def fake_github(search_handler, missing_users: typing.Collection = (), rest_only_users: typing.Collection = ()):
+    """
+    handler of searches by search_handler and of owner profiles, users in missing_users are not found, users in
+    rest_only_users are null in GraphQL but found through REST
+    """
+    def handler(request):
+        if request.url.endswith("/graphql"):
+            variables = json.loads(request.body)["variables"]
+            return 200, {"data": {
+                "o" + key[1:]: None if login in missing_users or login in rest_only_users else {
+                    "login": login, "name": login.upper(), "email": login + "@example.com",
+                    "url": "https://github.com/" + login
+                } for key, login in variables.items()
+            }}, {}
+        if "/search/" in request.url:
+            return search_handler(request)
+        if request.url.endswith("/rate_limit"):
+            reset = int(time.time()) + 60
+            return 200, {"resources": {
+                "core": {"limit": 5000, "remaining": 4321, "reset": reset},
+                "search": {"limit": 30, "remaining": 29, "reset": reset}
+            }}, {}
+        login = request.url.rsplit("/", 1)[1]
+        if login in missing_users:
+            return 404, {"message": "Not Found"}, {}
+        return 200, {"login": login, "name": None, "email": None, "html_url": "https://github.com/" + login}, {}
+    return handler
+
+
+class SendEmailTaskTester(unittest.TestCase):
+
+    @staticmethod
+    def record(username: str, repos: list) -> dict:
+        return {
+            "owner__username": username,
+            "owner__name": username.upper(),
+            "owner__email": [username + "@example.com"],
+            "owner__html_url": "https://github.com/" + username,
+            "repos": {name: {
+                "repo__name": name,
+                "repo__html_url": "https://github.com/{}/{}".format(username, name),
+                "status": status,
+                "date": date,
+                "history": history
+            } for name, status, date, history in repos}
+        }
+
+    def test_execute__moves_tagged_repos_to_waiting(self):
+        inputs = {
+            "alice": self.record("alice", [("a", "New", "2021-01-01 00:00:00", []),
+                                           ("b", "Waiting", "2021-01-01 00:00:00", [])]),
+            "bob": self.record("bob", [("c", "Redetected", "2021-01-03 00:00:00",
+                                        [{"date": "2021-01-02 00:00:00", "status": "Redetected"}])]),
+            "carol": self.record("carol", [("d", "Waiting", "2021-01-01 00:00:00", [])])
+        }
+        task = SendEmailTask().prepare({"domain": "smtp.example.com", "port": 25, "inputs": inputs},
+                                       {"username": "sender", "password": "secret", "tags": ["New", "Redetected"]})
+        with mock.patch("takedown.task.SendEmailTask.smtplib.SMTP") as smtp:
+            smtp.return_value.sendmail.return_value = {}
+            results = {record["owner__username"]: record for record in task.execute()["results"]}
+
+        # one message per owner with a tagged repo
+        self.assertEqual([call.args[1] for call in smtp.return_value.sendmail.call_args_list],
+                         [["alice@example.com"], ["bob@example.com"]])
+        alice_repos = {repo["repo__name"]: repo for repo in results["alice"]["repos"]}
+        self.assertEqual(alice_repos["a"]["status"], "Waiting")
+        self.assertEqual(alice_repos["a"]["history"], [{"date": "2021-01-01 00:00:00", "status": "New"}])
+        # repos not tagged are left as they were
+        self.assertEqual(alice_repos["b"]["date"], "2021-01-01 00:00:00")
+        self.assertEqual(results["carol"]["repos"][0]["history"], [])
+        # a redetection following a redetection is merged into the last entry
+        self.assertEqual(results["bob"]["repos"][0]["history"], [
+            {"date": "2021-01-02 00:00:00", "status": "Redetected", "last_date": "2021-01-03 00:00:00", "count": 2}
+        ])
+
+
+class MonitorTaskTester(unittest.TestCase):
+
+    def test_sweep__writes_to_empty_record_store(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        store_path = os.path.join(temp_dir, "records.db")
+        store = RecordStore(store_path)
+        monitor = MonitorTask(sweeps=1).prepare("token", "takedown", store, "code")
+        monitor.find_task.client.session.mount("https://", FakeGitHubAdapter(fake_github(fake_code_search(10))))
+        deltas = []
+
+        self.assertIs(monitor.execute(on_delta=deltas.append), store)
+        store.close()
+        self.assertEqual(len(deltas[0]["results"][0]["repos"]), 5)
+        store = RecordStore(store_path)
+        self.assertEqual(len(store), 1)
+        self.assertEqual(len(store["owner"]["repos"]), 5)
+        store.close()
+
+
+class OwnerEnricherTester(unittest.TestCase):
+
+    def create_enricher(self, handler, n_threads: int = 4) -> OwnerEnricher:
+        client = GitHubClient().authenticate("token")
+        self.adapter = FakeGitHubAdapter(handler)
+        client.session.mount("https://", self.adapter)
+        self.addCleanup(client.close)
+        return OwnerEnricher(client, n_threads)
+
+    @staticmethod
+    def owners(logins: typing.Iterable, owner_type: str = "User") -> dict:
+        return {"https://api.github.com/users/" + login: (login, owner_type, index)
+                for index, login in enumerate(logins)}
+
+    def test_enrich__batches_owners_in_graphql_queries(self):
+        enricher = self.create_enricher(fake_github(None))
+        logins = ["user{}".format(index) for index in range(150)]
+        profiles = enricher.enrich(self.owners(logins))
+
+        self.assertEqual(len(profiles), 150)
+        self.assertEqual(profiles["https://api.github.com/users/user42"], {
+            "login": "user42", "name": "USER42", "email": "user42@example.com",
+            "html_url": "https://github.com/user42"
+        })
+        # one query per 100 owners, no REST request
+        batches = [json.loads(request.body) for request in self.adapter.requests]
+        self.assertTrue(all(request.url.endswith("/graphql") for request in self.adapter.requests))
+        self.assertEqual(sorted(len(batch["variables"]) for batch in batches), [50, 100])
+        self.assertIn("o0: user(login: $l0)", batches[0]["query"])
+
+        enricher.enrich(self.owners(["org"], "Organization"))
+        self.assertIn("o0: organization(login: $l0)", json.loads(self.adapter.requests[-1].body)["query"])
+
+    def test_enrich__falls_back_to_rest_for_null_owners(self):
+        enricher = self.create_enricher(fake_github(None, missing_users={"gone"}, rest_only_users={"ghost"}))
+        profiles = enricher.enrich(self.owners(["user", "ghost", "gone"]))
+
+        self.assertEqual(profiles["https://api.github.com/users/user"]["name"], "USER")
+        self.assertEqual(profiles["https://api.github.com/users/ghost"]["login"], "ghost")
+        self.assertEqual(profiles["https://api.github.com/users/gone"], {})
+        rest_urls = sorted(request.url for request in self.adapter.requests if not request.url.endswith("/graphql"))
+        self.assertEqual(rest_urls, ["https://api.github.com/users/ghost", "https://api.github.com/users/gone"])
+        # resolved owners are not requested again
+        enricher.enrich(self.owners(["user", "ghost"]))
+        self.assertEqual(len(self.adapter.requests), 3)
+
+
+    def test_enrich__concurrent_calls_share_one_request(self):
+        entered, release = threading.Event(), threading.Event()
+        github = fake_github(None)
+
+        def handler(request):
+            entered.set()
+            release.wait(5)
+            return github(request)
+
+        enricher = self.create_enricher(handler)
+        owners = self.owners(["user", "other"])
+        results = [None, None]
+
+        def enrich(index: int, requested: dict):
+            results[index] = enricher.enrich(requested)
+
+        first = threading.Thread(target=enrich, args=(0, owners))
+        first.start()
+        entered.wait(5)
+        # the second call asks for an owner in flight, it waits for the request of the first call
+        second = threading.Thread(target=enrich, args=(1, dict(list(owners.items())[:1])))
+        second.start()
+        time.sleep(0.1)
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(len(self.adapter.requests), 1)
+        url = "https://api.github.com/users/user"
+        self.assertEqual(results[1][url]["login"], "user")
+        self.assertEqual(results[0][url], results[1][url])
+        self.assertEqual(results[0]["https://api.github.com/users/other"]["login"], "other")
+
+
+class FindRepoTaskTester(unittest.TestCase):
+
+    def create_task(self, search_handler, missing_users: typing.Collection = (), **config):
+        task = FindRepoTask(**config).prepare("token", "takedown", {})
+        self.adapter = FakeGitHubAdapter(fake_github(search_handler, missing_users))
+        task.client.session.mount("https://", self.adapter)
+        self.addCleanup(task.client.close)
+        return task
+
+    def test_execute__syncs_rate_limit_with_github(self):
+        task = self.create_task(fake_code_search(10))
+        self.assertEqual(task.client.rate_limit("core")["remaining"], 5000)
+        task.execute("code", ignore_warning=True, chain=True)
+
+        self.assertEqual([request.url for request in self.adapter.requests][0], "https://api.github.com/rate_limit")
+        # owners are resolved through GraphQL, the core budget is the one GitHub reported
+        self.assertEqual(task.client.rate_limit("core")["remaining"], 4321)
+
+    def test_search__pages_follow_links_after_first_result(self):
+        task = self.create_task(fake_code_search(450))
+        results = task.execute("code", ignore_warning=True, chain=True)
+
+        self.assertEqual(len(results["owner"]["repos"]), 225)
+        pages = [urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query) for request in self.adapter.requests
+                 if "/search/" in request.url]
+        # page 1 is only requested once, page 2 follows it and the others are requested through the links
+        self.assertEqual([query["page"][0] for query in pages], ["1", "2", "3", "4", "5"])
+        self.assertTrue(all("cursor" in query for query in pages[2:]))
+
+    def search_pages(self) -> list:
+        return [int(urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query)["page"][0])
+                for request in self.adapter.requests if "/search/" in request.url]
+
+    def test_incremental_search__stops_at_page_seen_before(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        task = self.create_task(fake_repo_search(500), incremental=os.path.join(temp_dir, "watermarks.json"))
+        # repos of page 1 from 50 on, and every repo of page 2, were found before
+        task.set_previous_records({"owner": {
+            "owner__username": "owner", "owner__name": "OWNER", "owner__email": ["owner@example.com"],
+            "owner__html_url": "https://github.com/owner",
+            "repos": {"repo{}".format(index): {"repo__name": "repo{}".format(index), "status": "New",
+                                               "date": str(datetime.datetime.now()), "history": []}
+                      for index in range(50, 500)}
+        }})
+        results = task.execute("repo", ignore_warning=True, chain=True)
+
+        self.assertEqual(self.search_pages(), [1, 2])
+        self.assertTrue(all("sort=updated&order=desc" in request.url for request in self.adapter.requests
+                            if "/search/" in request.url))
+        # repos found before on the pages searched are redetected, the ones past them are left as they were
+        repos = results["owner"]["repos"]
+        self.assertEqual(repos["repo0"]["status"], "New")
+        self.assertEqual(repos["repo150"]["status"], "Redetected")
+        self.assertEqual(repos["repo250"]["status"], "New")
+
+    def test_incremental_search__stops_at_watermark_and_saves_it(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        watermarks_path = os.path.join(temp_dir, "watermarks.json")
+        task = self.create_task(fake_repo_search(250), incremental=watermarks_path)
+        task.execute("repo", ignore_warning=True, chain=True)
+
+        # the first run pages through everything and keeps the newest repo__updated_at of the search
+        self.assertEqual(self.search_pages(), [1, 2, 3])
+        with open(watermarks_path) as file:
+            self.assertEqual(json.load(file), {"repo:takedown": "2021-06-01T00:00:00Z"})
+
+        # nothing was updated since, the next run stops at page 1
+        task = self.create_task(fake_repo_search(250), incremental=watermarks_path)
+        results = task.execute("repo", ignore_warning=True, chain=True)
+        self.assertEqual(self.search_pages(), [1])
+        self.assertEqual(len(results["owner"]["repos"]), 100)
+
+    def test_incremental_search__looks_up_record_store_per_result(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        store = RecordStore(os.path.join(temp_dir, "records.db"))
+        self.addCleanup(store.close)
+        store.save([{
+            "owner__username": username, "owner__name": username.title(), "owner__email": [],
+            "owner__html_url": "https://github.com/" + username,
+            "repos": [{"repo__name": "repo{}".format(index), "status": "New", "date": "2021-06-01 00:00:00",
+                       "history": []} for index in range(100)]
+        } for username in ("owner", "other")])
+        task = self.create_task(fake_repo_search(250), incremental=os.path.join(temp_dir, "watermarks.json"))
+        task.set_previous_records(store)
+        with mock.patch.object(RecordStore, "owner_summaries", autospec=True,
+                               side_effect=RecordStore.owner_summaries) as owner_summaries:
+            results = task.execute("repo", ignore_warning=True, chain=True)
+
+        # repos of page 1 are found in the store one by one, so the search stops there without a watermark
+        self.assertEqual(self.search_pages(), [1])
+        self.assertEqual(results["owner"]["repos"]["repo0"]["status"], "Redetected")
+        # the profile is read from the store for the owner found, other owners are not read
+        self.assertEqual(results["owner"]["owner__name"], "Owner")
+        self.assertEqual([list(call.args[1]) for call in owner_summaries.call_args_list], [["owner"]])
+        self.assertFalse(any("/graphql" in request.url or "/users/" in request.url
+                             for request in self.adapter.requests))
+
+    def test_sharded_search__pages_stream_into_pipeline(self):
+        task = self.create_task(fake_code_search(3500))
+        first_result = task.client.search("takedown", "code", fields=SEARCH_FIELDS)
+        pages = list(task.iter_result_pages("code", first_result, "takedown"))
+        # one item per shard page instead of one for the whole search
+        self.assertGreater(len(pages), 30)
+        self.assertTrue(all(isinstance(page_number, tuple) for page_number, _ in pages))
+        repo_ids = [result["repo__id"] for _, page in pages for result in page]
+        self.assertEqual(sorted(repo_ids), list(range(1750)))
+
+        results = task.execute("code", ignore_warning=True, chain=True)
+        self.assertEqual(len(results["owner"]["repos"]), 1750)
+
+    def test_unresolved_owner__is_grouped_by_search_result(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        store_path = os.path.join(temp_dir, "records.db")
+        seen_index_path = os.path.join(temp_dir, "seen.idx")
+        task = self.create_task(fake_code_search(10), missing_users={"owner"}, seen_index=seen_index_path)
+        store = RecordStore(store_path)
+        task.set_previous_records(store)
+        results = task.execute("code", ignore_warning=True, chain=True)
+        store.close()
+
+        self.assertEqual(list(results), ["owner"])
+        self.assertEqual(results["owner"]["owner__html_url"], "https://github.com/owner")
+        self.assertEqual(len(results["owner"]["repos"]), 5)
+        # the run is saved instead of failing on an owner without a username
+        store = RecordStore(store_path)
+        self.assertEqual(sorted(store["owner"]["repos"]), ["repo{}".format(index) for index in range(5)])
+        store.close()
+        self.assertEqual(len(RepoIndex(seen_index_path)), 5)
+
+    def test_checkpoint__saves_dates_of_yaml_records(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        input_path = os.path.join(temp_dir, "sent.yaml")
+        checkpoint_path = os.path.join(temp_dir, "checkpoint.json")
+        # send used to write dates as datetimes, which YAML loads back as datetimes
+        with open(input_path, "w") as file:
+            yaml.safe_dump({"results": [{
+                "owner__username": "owner", "owner__name": "OWNER", "owner__email": ["owner@example.com"],
+                "owner__html_url": "https://github.com/owner",
+                "repos": [{"repo__name": "repo0", "repo__html_url": "https://github.com/owner/repo0",
+                           "status": "Waiting", "date": datetime.datetime(2021, 1, 1, 10),
+                           "history": [{"status": "New", "date": datetime.datetime(2020, 12, 1, 10)}]}]
+            }]}, file)
+        previous_records = load_previous_outputs_as_inputs([input_path])
+        self.assertIsInstance(previous_records["owner"]["repos"]["repo0"]["date"], datetime.datetime)
+
+        task = self.create_task(fake_code_search(10), checkpoint=checkpoint_path)
+        task.set_previous_records(previous_records)
+        results = task.execute("code", ignore_warning=True, chain=True)
+
+        self.assertIsNotNone(results)
+        self.assertEqual(results["owner"]["repos"]["repo0"]["status"], "Redetected")
+        self.assertEqual(len(results["owner"]["repos"]), 5)
+        self.assertFalse(os.path.exists(checkpoint_path))
+
+    def test_sharded_search__resumes_after_the_shard_pages_grouped(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        checkpoint_path = os.path.join(temp_dir, "checkpoint.json")
+        search = fake_code_search(3500)
+        # pages after the first of a shard fail once 10 of them were served
+        served = []
+
+        def failing_search(request):
+            if urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query)["page"] == ["1"]:
+                return search(request)
+            if len(served) >= 10:
+                return 500, {"message": "Server Error"}, {}
+            served.append(request.url)
+            return search(request)
+
+        task = self.create_task(failing_search, checkpoint=checkpoint_path, max_attempts=1)
+        self.assertIsNone(task.execute("code", ignore_warning=True, chain=True))
+        state = Checkpoint(checkpoint_path).load()
+        grouped = {tuple(page) for page in state["shard_pages"]["code:takedown"]}
+        self.assertTrue(grouped)
+        self.assertFalse(state["searches"]["code:takedown"]["done"])
+        # one line per page grouped after the snapshot of the start of the run
+        with open(checkpoint_path) as file:
+            self.assertGreater(len(file.readlines()), len(grouped))
+
+        task = self.create_task(search, checkpoint=checkpoint_path, resume=True)
+        results = task.execute("code", ignore_warning=True, chain=True)
+        self.assertEqual(len(results["owner"]["repos"]), 1750)
+        queries = [urllib.parse.parse_qs(urllib.parse.urlparse(request.url).query) for request in self.adapter.requests
+                   if "/search/" in request.url]
+        refetched = {(query["q"][0], int(query["page"][0])) for query in queries if query["page"][0] != "1"}
+        self.assertFalse(refetched & grouped)
+        self.assertFalse(os.path.exists(checkpoint_path))
+
+
 if __name__ == '__main__':
     unittest.main()